@@ -0,0 +1,64 @@
+"""Fan-out of new-opportunity events from Redis pub/sub to SSE clients."""
+
+import asyncio
+import logging
+from contextlib import contextmanager
+
+import redis.asyncio as aioredis
+
+from app.cache import NEW_OPPORTUNITY_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+LISTENER_QUEUE_SIZE = 100
+RECONNECT_DELAY = 5
+
+
+class OpportunityFeed:
+    """Relays one Redis subscription to every connected SSE client.
+
+    A single subscriber per API process keeps the number of pub/sub
+    connections constant no matter how many browsers are listening.
+    """
+
+    def __init__(self, redis: aioredis.Redis):
+        self._redis = redis
+        self._listeners: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._relay())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @contextmanager
+    def listen(self):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=LISTENER_QUEUE_SIZE)
+        self._listeners.add(queue)
+        try:
+            yield queue
+        finally:
+            self._listeners.discard(queue)
+
+    async def _relay(self):
+        while True:
+            try:
+                async with self._redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(NEW_OPPORTUNITY_CHANNEL)
+                    async for message in pubsub.listen():
+                        data = message["data"].decode()
+                        for queue in self._listeners:
+                            if queue.full():
+                                continue  # slow client, drop rather than block the rest
+                            queue.put_nowait(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Opportunity feed lost its Redis subscription")
+                await asyncio.sleep(RECONNECT_DELAY)
@@ -1,18 +1,28 @@
 """API routes for the MacBid Arbitrage app."""
 
-import asyncio
-import json
+import base64
+import logging
 import uuid
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import datetime
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy import select, func, desc
+import orjson
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, HTTPException, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import JSON, select, func, desc, true, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, raiseload, selectinload
 from sse_starlette.sse import EventSourceResponse
 
-from app.db import get_db
+from app.cache import (
+    DASHBOARD_STATS_FRESH_KEY,
+    DASHBOARD_STATS_KEY,
+    DASHBOARD_STATS_STALE_TTL,
+    DASHBOARD_STATS_TTL,
+)
+from app.db import async_session, get_db
 from app.models.product import Product
 from app.models.listing import MacBidListing, AuctionStatus
 from app.models.price import PlatformPrice
@@ -28,25 +38,90 @@ from app.api.schemas import (
     DashboardStats,
     AlertSettingCreate,
     AlertSettingOut,
+    AlertSettingListAdapter,
+    ListingListAdapter,
+    OpportunityListAdapter,
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _list_response(adapter: TypeAdapter, rows, next_cursor: str | None = None) -> Response:
+    """Validate ORM rows and encode them straight to JSON bytes.
+
+    The adapters are built once at import, and returning a Response skips
+    FastAPI's own response_model pass; response_model stays on the routes
+    for the OpenAPI schema only. The keyset cursor for the following page,
+    if any, goes in the X-Next-Cursor header.
+    """
+    validated = adapter.validate_python(rows, from_attributes=True)
+    response = Response(content=adapter.dump_json(validated), media_type="application/json")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+def _encode_cursor(sort_value, row_id: uuid.UUID) -> str:
+    value = sort_value.isoformat() if isinstance(sort_value, datetime) else str(sort_value)
+    return base64.urlsafe_b64encode(orjson.dumps([value, str(row_id)])).decode()
+
+
+def _decode_cursor(cursor: str, sort_col) -> tuple:
+    try:
+        value, row_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        python_type = sort_col.type.python_type
+        if python_type is datetime:
+            value = datetime.fromisoformat(value)
+        else:
+            value = python_type(value)
+        return value, uuid.UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _paginate(query, sort_col, id_col, descending: bool, after: str | None, offset: int, limit: int):
+    """Order by (sort_col, id) and seek past the cursor, or fall back to offset."""
+    if after:
+        key = tuple_(sort_col, id_col)
+        bound = tuple_(*_decode_cursor(after, sort_col))
+        query = query.where(key < bound if descending else key > bound)
+    elif offset:
+        query = query.offset(offset)
+
+    if descending:
+        query = query.order_by(sort_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(sort_col.asc(), id_col.asc())
+    return query.limit(limit)
+
+
+def _next_cursor(rows, sort_attr: str, limit: int) -> str | None:
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    return _encode_cursor(getattr(last, sort_attr), last.id)
+
 
 # --- Opportunities ---
 
 @router.get("/opportunities", response_model=list[OpportunityOut])
 async def list_opportunities(
     db: AsyncSession = Depends(get_db),
-    sort_by: str = Query("profit", enum=["profit", "roi_pct", "confidence_score", "created_at"]),
-    sort_dir: str = Query("desc", enum=["asc", "desc"]),
+    sort_by: Literal["profit", "roi_pct", "confidence_score", "created_at"] = Query("profit"),
+    sort_dir: Literal["asc", "desc"] = Query("desc"),
     platform: Optional[str] = Query(None),
     min_profit: Optional[float] = Query(None),
     min_roi: Optional[float] = Query(None),
     limit: int = Query(50, le=200),
     offset: int = Query(0),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
 ):
-    query = select(Opportunity)
+    # raiseload guards against lazy loads sneaking into serialization.
+    query = select(Opportunity).options(raiseload("*"))
 
     if platform:
         query = query.where(Opportunity.sell_platform == platform)
@@ -56,36 +131,35 @@ async def list_opportunities(
         query = query.where(Opportunity.roi_pct >= min_roi)
 
     sort_col = getattr(Opportunity, sort_by)
-    query = query.order_by(desc(sort_col) if sort_dir == "desc" else sort_col)
-    query = query.offset(offset).limit(limit)
+    query = _paginate(query, sort_col, Opportunity.id, sort_dir == "desc", after, offset, limit)
 
     result = await db.execute(query)
-    return result.scalars().all()
+    rows = result.scalars().all()
+    return _list_response(OpportunityListAdapter, rows, _next_cursor(rows, sort_by, limit))
 
 
 @router.get("/opportunities/{opportunity_id}", response_model=OpportunityDetail)
 async def get_opportunity(opportunity_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    # Opportunity, product and listing arrive in one joined SELECT; the
+    # product's prices follow in a single IN-list SELECT.
     result = await db.execute(
-        select(Opportunity).where(Opportunity.id == opportunity_id)
+        select(Opportunity)
+        .where(Opportunity.id == opportunity_id)
+        .options(
+            joinedload(Opportunity.macbid_listing),
+            joinedload(Opportunity.product).selectinload(Product.prices),
+        )
     )
-    opp = result.scalar_one_or_none()
+    opp = result.unique().scalar_one_or_none()
     if not opp:
         raise HTTPException(status_code=404, detail="Opportunity not found")
 
-    product = await db.get(Product, opp.product_id)
-    listing = await db.get(MacBidListing, opp.macbid_listing_id)
-
-    prices_result = await db.execute(
-        select(PlatformPrice)
-        .where(PlatformPrice.product_id == opp.product_id)
-        .order_by(PlatformPrice.fetched_at.desc())
-    )
-    prices = prices_result.scalars().all()
+    prices = sorted(opp.product.prices, key=lambda p: p.fetched_at, reverse=True)
 
     return OpportunityDetail(
         **{c.name: getattr(opp, c.name) for c in opp.__table__.columns},
-        product=product,
-        listing=listing,
+        product=opp.product,
+        listing=opp.macbid_listing,
         platform_prices=prices,
     )
 
@@ -98,15 +172,17 @@ async def list_listings(
     status: Optional[str] = Query(None),
     limit: int = Query(50, le=200),
     offset: int = Query(0),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
 ):
-    query = select(MacBidListing).order_by(MacBidListing.created_at.desc())
+    query = select(MacBidListing).options(raiseload("*"))
 
     if status:
         query = query.where(MacBidListing.status == status)
 
-    query = query.offset(offset).limit(limit)
+    query = _paginate(query, MacBidListing.created_at, MacBidListing.id, True, after, offset, limit)
     result = await db.execute(query)
-    return result.scalars().all()
+    rows = result.scalars().all()
+    return _list_response(ListingListAdapter, rows, _next_cursor(rows, "created_at", limit))
 
 
 # --- Product Prices ---
@@ -124,86 +200,155 @@ async def get_product_prices(product_id: uuid.UUID, db: AsyncSession = Depends(g
 # --- Dashboard Stats ---
 
 @router.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
-    # Total opportunities
-    total_result = await db.execute(select(func.count(Opportunity.id)))
-    total = total_result.scalar() or 0
-
-    # Average profit and ROI
-    avg_result = await db.execute(
-        select(func.avg(Opportunity.profit), func.avg(Opportunity.roi_pct))
-    )
-    row = avg_result.one()
-    avg_profit = float(row[0] or 0)
-    avg_roi = float(row[1] or 0)
-
-    # Active listings count
-    active_result = await db.execute(
-        select(func.count(MacBidListing.id))
+async def get_dashboard_stats(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+):
+    redis = request.app.state.redis
+    cached, fresh = await _get_cached_dashboard_stats(redis)
+    if cached is not None:
+        # Serve the cached copy; once it goes stale, the first request to
+        # claim the freshness marker recomputes it in the background.
+        if not fresh and await _claim_dashboard_refresh(redis):
+            background_tasks.add_task(_revalidate_dashboard_stats, redis)
+        return Response(content=cached, media_type="application/json")
+
+    stats = await _compute_dashboard_stats(db)
+    await _set_cached_dashboard_stats(redis, stats)
+    return stats
+
+
+async def _compute_dashboard_stats(db: AsyncSession) -> DashboardStats:
+    # All aggregates are computed server-side and returned as a single row,
+    # so the dashboard costs one round-trip instead of five.
+    totals = select(
+        func.count(Opportunity.id).label("total"),
+        func.avg(Opportunity.profit).label("avg_profit"),
+        func.avg(Opportunity.roi_pct).label("avg_roi"),
+    ).cte("totals")
+
+    active = (
+        select(func.count(MacBidListing.id).label("active"))
         .where(MacBidListing.status == AuctionStatus.ACTIVE)
+        .cte("active")
     )
-    active_listings = active_result.scalar() or 0
 
     # Top categories (from products linked to opportunities)
-    cat_query = (
+    top_cats = (
         select(Product.category, func.count(Opportunity.id).label("count"))
         .join(Opportunity, Opportunity.product_id == Product.id)
         .where(Product.category.isnot(None))
         .group_by(Product.category)
         .order_by(desc("count"))
         .limit(5)
+        .subquery("top_cats")
+    )
+    cats_json = (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "category", top_cats.c.category, "count", top_cats.c.count
+                    ),
+                    top_cats.c.count.desc(),
+                ),
+                type_=JSON,
+            )
+        )
+        .scalar_subquery()
     )
-    cat_result = await db.execute(cat_query)
-    top_categories = [{"category": r[0], "count": r[1]} for r in cat_result.all()]
 
     # Recent opportunities
-    recent_result = await db.execute(
+    recent = (
         select(Opportunity)
         .order_by(Opportunity.created_at.desc())
         .limit(10)
+        .subquery("recent")
+    )
+    recent_json = (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.row_to_json(recent.table_valued()), recent.c.created_at.desc()
+                ),
+                type_=JSON,
+            )
+        )
+        .scalar_subquery()
+    )
+
+    result = await db.execute(
+        select(
+            totals.c.total,
+            totals.c.avg_profit,
+            totals.c.avg_roi,
+            active.c.active,
+            cats_json.label("top_categories"),
+            recent_json.label("recent"),
+        ).select_from(totals.join(active, true()))
     )
-    recent = recent_result.scalars().all()
+    row = result.one()
 
     return DashboardStats(
-        total_opportunities=total,
-        avg_profit=round(avg_profit, 2),
-        avg_roi=round(avg_roi, 2),
-        top_categories=top_categories,
-        active_listings=active_listings,
-        recent_opportunities=recent,
+        total_opportunities=row.total or 0,
+        avg_profit=round(float(row.avg_profit or 0), 2),
+        avg_roi=round(float(row.avg_roi or 0), 2),
+        top_categories=row.top_categories or [],
+        active_listings=row.active or 0,
+        recent_opportunities=row.recent or [],
     )
 
 
+async def _revalidate_dashboard_stats(redis):
+    async with async_session() as db:
+        stats = await _compute_dashboard_stats(db)
+    await _set_cached_dashboard_stats(redis, stats)
+
+
+async def _get_cached_dashboard_stats(redis) -> tuple[bytes | None, bool]:
+    try:
+        cached, fresh = await redis.mget(DASHBOARD_STATS_KEY, DASHBOARD_STATS_FRESH_KEY)
+        return cached, fresh is not None
+    except Exception:
+        logger.debug("Cache miss/error for %s", DASHBOARD_STATS_KEY)
+    return None, False
+
+
+async def _claim_dashboard_refresh(redis) -> bool:
+    try:
+        return bool(await redis.set(DASHBOARD_STATS_FRESH_KEY, 1, ex=DASHBOARD_STATS_TTL, nx=True))
+    except Exception:
+        logger.debug("Cache set error for %s", DASHBOARD_STATS_FRESH_KEY)
+    return False
+
+
+async def _set_cached_dashboard_stats(redis, stats: DashboardStats):
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.set(DASHBOARD_STATS_KEY, stats.model_dump_json(), ex=DASHBOARD_STATS_STALE_TTL)
+            pipe.set(DASHBOARD_STATS_FRESH_KEY, 1, ex=DASHBOARD_STATS_TTL)
+            await pipe.execute()
+    except Exception:
+        logger.debug("Cache set error for %s", DASHBOARD_STATS_KEY)
+
+
 # --- SSE Stream ---
 
 @router.get("/stream")
-async def stream_opportunities(db: AsyncSession = Depends(get_db)):
-    """Server-Sent Events endpoint for real-time opportunity updates."""
+async def stream_opportunities(request: Request):
+    """Server-Sent Events endpoint for real-time opportunity updates.
+
+    Events are pushed from the refresh task over Redis pub/sub as soon as
+    new opportunities are committed, instead of polling the database.
+    """
+    feed = request.app.state.opportunity_feed
 
     async def event_generator():
-        last_check = datetime.now(timezone.utc)
-        while True:
-            await asyncio.sleep(10)  # Check every 10 seconds
-            result = await db.execute(
-                select(Opportunity)
-                .where(Opportunity.created_at > last_check)
-                .order_by(Opportunity.created_at.desc())
-                .limit(20)
-            )
-            new_opps = result.scalars().all()
-            last_check = datetime.now(timezone.utc)
-
-            for opp in new_opps:
-                data = {
-                    "id": str(opp.id),
-                    "product_id": str(opp.product_id),
-                    "profit": float(opp.profit),
-                    "roi_pct": float(opp.roi_pct),
-                    "sell_platform": opp.sell_platform,
-                    "buy_cost": float(opp.buy_cost),
-                    "estimated_sell_price": float(opp.estimated_sell_price),
-                }
-                yield {"event": "new_opportunity", "data": json.dumps(data)}
+        with feed.listen() as queue:
+            while True:
+                data = await queue.get()
+                yield {"event": "new_opportunity", "data": data}
 
     return EventSourceResponse(event_generator())
 
@@ -229,7 +374,7 @@ async def create_alert_setting(body: AlertSettingCreate, db: AsyncSession = Depe
 @router.get("/alerts/settings", response_model=list[AlertSettingOut])
 async def list_alert_settings(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(AlertSetting).order_by(AlertSetting.created_at.desc()))
-    return result.scalars().all()
+    return _list_response(AlertSettingListAdapter, result.scalars().all())
 
 
 @router.put("/alerts/settings/{setting_id}", response_model=AlertSettingOut)
@@ -3,7 +3,7 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, TypeAdapter
 
 
 # --- Products ---
@@ -38,6 +38,9 @@ class ListingOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+ListingListAdapter = TypeAdapter(list[ListingOut])
+
+
 class ListingWithProduct(ListingOut):
     product: ProductOut
 
@@ -76,6 +79,9 @@ class OpportunityOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+OpportunityListAdapter = TypeAdapter(list[OpportunityOut])
+
+
 class OpportunityDetail(OpportunityOut):
     product: ProductOut
     listing: ListingOut
@@ -113,3 +119,6 @@ class AlertSettingOut(BaseModel):
     created_at: datetime
 
     model_config = {"from_attributes": True}
+
+
+AlertSettingListAdapter = TypeAdapter(list[AlertSettingOut])
@@ -0,0 +1,56 @@
+"""Shared Redis client and cache keys used by the API and the Celery workers."""
+
+import asyncio
+
+import redis.asyncio as aioredis
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Dashboard stats are served from Redis. The payload outlives its freshness
+# marker so a stale copy can be returned while one request refreshes it.
+DASHBOARD_STATS_KEY = "api-cache:dashboard:stats"
+DASHBOARD_STATS_FRESH_KEY = "api-cache:dashboard:stats:fresh"
+DASHBOARD_STATS_TTL = 60  # 1 minute
+DASHBOARD_STATS_STALE_TTL = 600  # 10 minutes
+
+# Pub/sub channel the refresh task announces newly created opportunities on
+NEW_OPPORTUNITY_CHANNEL = "opportunities:new"
+
+# Compare-and-delete for token-guarded locks: the lock is deleted only if it
+# still holds the caller's token, since an expired lock may already have been
+# taken over by someone else. KEYS[1] is the lock, ARGV[1] the token.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+_redis: aioredis.Redis | None = None
+_redis_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Return the process-wide Redis client backed by one bounded pool.
+
+    Replies come back as raw bytes: cached payloads are JSON that orjson
+    parses directly, and the few callers that need text decode it themselves.
+
+    Connections are tied to the event loop that opened them, so the client
+    is rebuilt if it's ever called from a different loop. Celery tasks all
+    share their worker's loop (see ``app.tasks.db.run``).
+    """
+    global _redis, _redis_loop
+    loop = asyncio.get_running_loop()
+    if _redis is None or _redis_loop is not loop:
+        pool = aioredis.BlockingConnectionPool.from_url(
+            settings.redis_url,
+            decode_responses=False,
+            max_connections=settings.redis_max_connections,
+        )
+        _redis = aioredis.Redis.from_pool(pool)
+        _redis_loop = loop
+    return _redis
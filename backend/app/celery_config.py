@@ -1,5 +1,6 @@
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
 
 from app.config import get_settings
 
@@ -27,6 +28,20 @@ celery_app.conf.update(
     task_acks_late=True,
     worker_prefetch_multiplier=1,
     broker_connection_retry_on_startup=True,
+    # Network-bound tasks and the SQL-heavy refresh run on separate workers,
+    # so a slow scrape or a burst of lookups never delays the refresh. Price
+    # lookups get a worker of their own: its concurrency caps the eBay and
+    # Keepa calls in flight, and a scrape's burst can't hold up the io queue.
+    task_queues=(Queue("io"), Queue("lookup"), Queue("cpu")),
+    task_default_queue="cpu",
+    task_routes={
+        "app.tasks.scrape.scrape_macbid": {"queue": "io"},
+        "app.tasks.scrape.persist_scrape_chunk": {"queue": "io"},
+        "app.tasks.lookup.lookup_prices": {"queue": "lookup"},
+        "app.tasks.lookup.refresh_amazon_prices": {"queue": "lookup"},
+        "app.tasks.alerts.check_and_send_alerts": {"queue": "io"},
+        "app.tasks.calculate.refresh_opportunities": {"queue": "cpu"},
+    },
 )
 
 celery_app.conf.beat_schedule = {
@@ -38,6 +53,12 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.calculate.refresh_opportunities",
         "schedule": crontab(minute="*/15"),
     },
+    # Less often than the Keepa cache TTL, so each run reads fresh prices
+    # rather than re-storing the previous run's
+    "refresh-amazon-prices": {
+        "task": "app.tasks.lookup.refresh_amazon_prices",
+        "schedule": crontab(minute=30, hour="*/6"),
+    },
     "check-alerts": {
         "task": "app.tasks.alerts.check_and_send_alerts",
         "schedule": crontab(minute="*/20"),
@@ -1,11 +1,49 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import get_settings
 
 settings = get_settings()
 
-engine = create_async_engine(settings.database_url, echo=False)
+
+def make_engine(**overrides) -> AsyncEngine:
+    """Create an async engine with the app's pool and asyncpg tuning.
+
+    Keyword arguments override the defaults, e.g. a smaller pool for a
+    Celery worker.
+    """
+    options = {
+        "echo": False,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "insertmanyvalues_page_size": 1000,  # rows per multi-VALUES INSERT batch
+        "connect_args": {
+            "statement_cache_size": 1024,  # asyncpg's server-side statement cache
+            "prepared_statement_cache_size": 1024,  # SQLAlchemy adapter's cache
+            "server_settings": {"jit": "off"},  # short OLTP queries don't benefit from JIT
+        },
+    }
+    options.update(overrides)
+    engine = create_async_engine(settings.database_url, **options)
+    event.listen(engine.sync_engine, "connect", _register_float_numeric)
+    return engine
+
+
+def _register_float_numeric(dbapi_connection, connection_record):
+    # Decode NUMERIC as float rather than Decimal. Every money column here is
+    # Numeric(10, 2) or narrower, well inside float precision, and all the
+    # arithmetic on them is done in float anyway.
+    dbapi_connection.run_async(
+        lambda conn: conn.set_type_codec(
+            "numeric", encoder=str, decoder=float, schema="pg_catalog", format="text",
+        )
+    )
+
+
+engine = make_engine()
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 
@@ -1,11 +1,18 @@
+import asyncio
 import logging
+import random
 import time
-import json
+import uuid
 
 import httpx
+import orjson
+from cachetools import TTLCache
 import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 
+from app.cache import RELEASE_LOCK_SCRIPT, get_redis
 from app.config import get_settings
+from app.integrations.http import get_http_client
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -13,30 +20,70 @@ settings = get_settings()
 EBAY_TOKEN_URL = "https://api.ebay.com/identity/v1/oauth2/token"
 EBAY_BROWSE_URL = f"{settings.ebay_api_base}/buy/browse/v1/item_summary/search"
 
+HTTP_TIMEOUT = 15  # seconds
 CACHE_TTL = 7200  # 2 hours
 
+TOKEN_CACHE_KEY = "ebay:oauth:token"
+TOKEN_LOCK_KEY = "ebay:oauth:token:lock"
+TOKEN_LOCK_TTL = 30  # seconds
+TOKEN_WAIT_ATTEMPTS = 20
+
+_EMPTY: dict = {}
+
 
 class EbayClient:
     """eBay Browse API client with OAuth 2.0 client credentials flow."""
 
-    def __init__(self):
+    # Per-process L1 in front of Redis for the hottest keys, shared by all
+    # instances. Entries expire well before their Redis copies.
+    _l1: TTLCache = TTLCache(maxsize=1024, ttl=300)
+
+    def __init__(
+        self,
+        redis: aioredis.Redis | None = None,
+        http: httpx.AsyncClient | None = None,
+    ):
         self._access_token: str | None = None
         self._token_expires_at: float = 0
-        self._http = httpx.AsyncClient(timeout=15)
-        self._redis: aioredis.Redis | None = None
-
-    async def _get_redis(self) -> aioredis.Redis:
-        if self._redis is None:
-            self._redis = aioredis.from_url(settings.redis_url, decode_responses=True)
-        return self._redis
+        self._http = http or get_http_client()
+        self._redis = redis or get_redis()
 
     async def _get_token(self) -> str:
         if self._access_token and time.time() < self._token_expires_at - 60:
             return self._access_token
 
+        # The token is shared through Redis so workers don't each re-OAuth.
+        # Only the holder of the refresh lock talks to eBay; everyone else
+        # polls briefly for the token it publishes.
+        try:
+            for _ in range(TOKEN_WAIT_ATTEMPTS):
+                async with self._redis.pipeline() as pipe:
+                    pipe.get(TOKEN_CACHE_KEY)
+                    pipe.ttl(TOKEN_CACHE_KEY)
+                    token, ttl = await pipe.execute()
+                if token:
+                    self._access_token = token.decode()
+                    self._token_expires_at = time.time() + ttl + 60
+                    return self._access_token
+
+                lock_id = uuid.uuid4().hex
+                if await self._redis.set(TOKEN_LOCK_KEY, lock_id, nx=True, ex=TOKEN_LOCK_TTL):
+                    try:
+                        return await self._refresh_token(share=True)
+                    finally:
+                        await self._release_lock(lock_id)
+
+                await asyncio.sleep(0.2 + random.random() * 0.3)
+        except RedisError:
+            logger.debug("Shared token cache unavailable, refreshing locally")
+
+        return await self._refresh_token(share=False)
+
+    async def _refresh_token(self, share: bool) -> str:
         logger.info("Refreshing eBay OAuth token")
         resp = await self._http.post(
             EBAY_TOKEN_URL,
+            timeout=HTTP_TIMEOUT,
             data={
                 "grant_type": "client_credentials",
                 "scope": "https://api.ebay.com/oauth/api_scope",
@@ -46,10 +93,27 @@ class EbayClient:
         )
         resp.raise_for_status()
         data = resp.json()
+        expires_in = data.get("expires_in", 7200)
         self._access_token = data["access_token"]
-        self._token_expires_at = time.time() + data.get("expires_in", 7200)
+        self._token_expires_at = time.time() + expires_in
+        if share:
+            # The token is already ours; a Redis error here only means other
+            # workers won't see it, and must not trigger a second refresh
+            try:
+                await self._redis.set(
+                    TOKEN_CACHE_KEY, self._access_token, ex=max(expires_in - 60, 1)
+                )
+            except RedisError:
+                logger.debug("Failed to share refreshed eBay token")
         return self._access_token
 
+    async def _release_lock(self, lock_id: str):
+        try:
+            await self._redis.eval(RELEASE_LOCK_SCRIPT, 1, TOKEN_LOCK_KEY, lock_id)
+        except RedisError:
+            # The lock expires on its own after TOKEN_LOCK_TTL
+            logger.debug("Failed to release eBay token lock")
+
     async def search_by_upc(self, upc: str) -> list[dict]:
         """Search eBay by UPC. Returns list of item summaries."""
         cache_key = f"ebay:upc:{upc}"
@@ -85,6 +149,7 @@ class EbayClient:
     async def _browse_search(self, params: dict, token: str) -> list[dict]:
         resp = await self._http.get(
             EBAY_BROWSE_URL,
+            timeout=HTTP_TIMEOUT,
             params=params,
             headers={
                 "Authorization": f"Bearer {token}",
@@ -100,55 +165,52 @@ class EbayClient:
 
     def _parse_results(self, data: dict) -> list[dict]:
         items = []
-        for raw in data.get("itemSummaries", []):
-            price_val = raw.get("price", {})
-            shipping = raw.get("shippingOptions", [{}])
+        # `or _EMPTY` skips allocating a throwaway dict for missing fields
+        for raw in data.get("itemSummaries") or ():
+            price_val = raw.get("price") or _EMPTY
+            shipping = raw.get("shippingOptions")
             shipping_cost = 0.0
             if shipping:
-                ship_price = shipping[0].get("shippingCost", {})
-                shipping_cost = float(ship_price.get("value", 0))
+                ship_price = shipping[0].get("shippingCost") or _EMPTY
+                shipping_cost = float(ship_price.get("value") or 0)
 
-            condition = raw.get("condition", "")
+            cats = raw.get("categories")
             item = {
                 "platform": "ebay",
                 "title": raw.get("title", ""),
-                "price": float(price_val.get("value", 0)),
+                "price": float(price_val.get("value") or 0),
                 "currency": price_val.get("currency", "USD"),
-                "condition": condition,
+                "condition": raw.get("condition", ""),
                 "shipping_cost": shipping_cost,
                 "url": raw.get("itemWebUrl", ""),
-                "image_url": raw.get("image", {}).get("imageUrl"),
+                "image_url": (raw.get("image") or _EMPTY).get("imageUrl"),
                 "item_id": raw.get("itemId"),
-                "seller": raw.get("seller", {}).get("username"),
+                "seller": (raw.get("seller") or _EMPTY).get("username"),
                 "extra_data": {
-                    "buying_options": raw.get("buyingOptions", []),
+                    "buying_options": raw.get("buyingOptions") or [],
                     "item_group_type": raw.get("itemGroupType"),
-                    "categories": [
-                        c.get("categoryName") for c in raw.get("categories", [])
-                    ],
+                    "categories": [c.get("categoryName") for c in cats] if cats else [],
                 },
             }
             items.append(item)
         return items
 
     async def _get_cached(self, key: str) -> list[dict] | None:
+        cached = self._l1.get(key)
+        if cached is not None:
+            return cached
         try:
-            r = await self._get_redis()
-            raw = await r.get(key)
+            raw = await self._redis.get(key)
             if raw:
-                return json.loads(raw)
+                self._l1[key] = data = orjson.loads(raw)
+                return data
         except Exception:
             logger.debug("Cache miss/error for %s", key)
         return None
 
     async def _set_cached(self, key: str, data: list[dict]):
+        self._l1[key] = data
         try:
-            r = await self._get_redis()
-            await r.set(key, json.dumps(data), ex=CACHE_TTL)
+            await self._redis.set(key, orjson.dumps(data), ex=CACHE_TTL)
         except Exception:
             logger.debug("Cache set error for %s", key)
-
-    async def close(self):
-        await self._http.aclose()
-        if self._redis:
-            await self._redis.aclose()
@@ -0,0 +1,40 @@
+"""Shared outbound HTTP client for the third-party API integrations."""
+
+import asyncio
+
+import httpx
+
+_http: httpx.AsyncClient | None = None
+_http_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled HTTP/2 client.
+
+    One keep-alive pool is shared by every integration so TLS handshakes to
+    eBay and Keepa are paid once per connection rather than once per client,
+    and concurrent requests to the same host multiplex over HTTP/2. Like the
+    Redis client, it is rebuilt when called from a new event loop.
+    """
+    global _http, _http_loop
+    loop = asyncio.get_running_loop()
+    if _http is None or _http_loop is not loop:
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=2,  # connection failures only; HTTP errors are not retried
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+        _http = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(20, connect=5),
+        )
+        _http_loop = loop
+    return _http
+
+
+async def close_http_client():
+    """Close the shared client's connections, e.g. when a worker shuts down."""
+    global _http, _http_loop
+    if _http is not None:
+        await _http.aclose()
+        _http = _http_loop = None
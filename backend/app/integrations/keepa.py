@@ -1,29 +1,46 @@
 import logging
-import json
 
 import httpx
+import orjson
+from cachetools import TTLCache
 import redis.asyncio as aioredis
 
+from app.cache import get_redis
 from app.config import get_settings
+from app.integrations.http import get_http_client
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 KEEPA_API_BASE = "https://api.keepa.com"
+HTTP_TIMEOUT = 20  # seconds
 CACHE_TTL = 14400  # 4 hours
+KEEPA_BATCH_SIZE = 100  # max ASINs per /product request
+
+_EMPTY: dict = {}
+
+
+def _cents_to_dollars(val):
+    """Keepa stores prices in cents; negative values mean no data."""
+    if val is None or val < 0:
+        return None
+    return val / 100
 
 
 class KeepaClient:
     """Keepa API client for Amazon price history and product data."""
 
-    def __init__(self):
-        self._http = httpx.AsyncClient(timeout=20)
-        self._redis: aioredis.Redis | None = None
+    # Per-process L1 in front of Redis for the hottest keys, shared by all
+    # instances. Entries expire well before their Redis copies.
+    _l1: TTLCache = TTLCache(maxsize=4096, ttl=600)
 
-    async def _get_redis(self) -> aioredis.Redis:
-        if self._redis is None:
-            self._redis = aioredis.from_url(settings.redis_url, decode_responses=True)
-        return self._redis
+    def __init__(
+        self,
+        redis: aioredis.Redis | None = None,
+        http: httpx.AsyncClient | None = None,
+    ):
+        self._http = http or get_http_client()
+        self._redis = redis or get_redis()
 
     async def lookup_by_upc(self, upc: str) -> dict | None:
         """Look up an Amazon product by UPC via Keepa."""
@@ -32,19 +49,7 @@ class KeepaClient:
         if cached is not None:
             return cached
 
-        resp = await self._http.get(
-            f"{KEEPA_API_BASE}/product",
-            params={
-                "key": settings.keepa_api_key,
-                "domain": "1",  # Amazon.com (US)
-                "code": upc,
-                "stats": "180",  # 180-day stats
-                "offers": "20",
-            },
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        products = data.get("products", [])
+        products = await self._fetch_products(code=upc)
         if not products:
             return None
 
@@ -59,50 +64,94 @@ class KeepaClient:
         if cached is not None:
             return cached
 
+        products = await self._fetch_products(asin=asin)
+        if not products:
+            return None
+
+        result = self._parse_product(products[0])
+        await self._set_cached(cache_key, result)
+        return result
+
+    async def lookup_many_asins(self, asins: list[str]) -> dict[str, dict | None]:
+        """Look up many ASINs at once. Unknown ASINs map to None.
+
+        Entries found in neither the L1 nor Redis (one MGET) are requested
+        from Keepa up to 100 per call and written back in one pipeline.
+        """
+        results: dict[str, dict | None] = {}
+        remote: list[str] = []
+        for asin in asins:
+            results[asin] = self._l1.get(f"keepa:asin:{asin}")
+            if results[asin] is None and asin not in remote:
+                remote.append(asin)
+
+        misses = remote
+        if remote:
+            try:
+                raws = await self._redis.mget([f"keepa:asin:{asin}" for asin in remote])
+                misses = []
+                for asin, raw in zip(remote, raws):
+                    if raw:
+                        self._l1[f"keepa:asin:{asin}"] = results[asin] = orjson.loads(raw)
+                    else:
+                        misses.append(asin)
+            except Exception:
+                logger.debug("Cache mget error for %d ASINs", len(remote))
+
+        fetched: dict[str, dict] = {}
+        for i in range(0, len(misses), KEEPA_BATCH_SIZE):
+            chunk = misses[i:i + KEEPA_BATCH_SIZE]
+            for product in await self._fetch_products(asin=",".join(chunk)):
+                parsed = self._parse_product(product)
+                if parsed["asin"] in results:
+                    fetched[parsed["asin"]] = parsed
+
+        if fetched:
+            results.update(fetched)
+            self._l1.update({f"keepa:asin:{asin}": data for asin, data in fetched.items()})
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for asin, data in fetched.items():
+                        pipe.set(f"keepa:asin:{asin}", orjson.dumps(data), ex=CACHE_TTL)
+                    await pipe.execute()
+            except Exception:
+                logger.debug("Cache set error for %d ASINs", len(fetched))
+
+        return results
+
+    async def _fetch_products(self, **query: str) -> list[dict]:
         resp = await self._http.get(
             f"{KEEPA_API_BASE}/product",
+            timeout=HTTP_TIMEOUT,
             params={
                 "key": settings.keepa_api_key,
-                "domain": "1",
-                "asin": asin,
-                "stats": "180",
+                "domain": "1",  # Amazon.com (US)
+                "stats": "180",  # 180-day stats
                 "offers": "20",
+                **query,
             },
         )
         resp.raise_for_status()
-        data = resp.json()
-        products = data.get("products", [])
-        if not products:
-            return None
-
-        result = self._parse_product(products[0])
-        await self._set_cached(cache_key, result)
-        return result
+        return resp.json().get("products", [])
 
     def _parse_product(self, product: dict) -> dict:
         """Parse Keepa product data into our standard format."""
-        stats = product.get("stats", {})
+        stats = product.get("stats") or _EMPTY
 
-        # Keepa stores prices in cents (divide by 100)
-        def cents_to_dollars(val):
-            if val is None or val < 0:
-                return None
-            return val / 100
-
-        current_prices = stats.get("current", [])
+        current_prices = stats.get("current") or ()
         # Index 0 = Amazon price, 1 = New 3rd party, 2 = Used
-        amazon_price = cents_to_dollars(current_prices[0]) if len(current_prices) > 0 else None
-        new_3p_price = cents_to_dollars(current_prices[1]) if len(current_prices) > 1 else None
-        used_price = cents_to_dollars(current_prices[2]) if len(current_prices) > 2 else None
+        amazon_price = _cents_to_dollars(current_prices[0]) if len(current_prices) > 0 else None
+        new_3p_price = _cents_to_dollars(current_prices[1]) if len(current_prices) > 1 else None
+        used_price = _cents_to_dollars(current_prices[2]) if len(current_prices) > 2 else None
 
         # Average prices
-        avg_prices = stats.get("avg", [])
+        avg_prices = stats.get("avg") or ()
         avg_30 = avg_prices[0] if len(avg_prices) > 0 else None
         avg_90 = avg_prices[1] if len(avg_prices) > 1 else None
 
         # Best Seller Rank
         bsr = None
-        sales_ranks = product.get("salesRanks", {})
+        sales_ranks = product.get("salesRanks")
         if sales_ranks:
             # Get the first category's current BSR
             for _cat_id, ranks in sales_ranks.items():
@@ -111,14 +160,15 @@ class KeepaClient:
                 break
 
         # Offer count
-        offer_counts = stats.get("offerCounts", [])
+        offer_counts = stats.get("offerCounts") or ()
         new_offer_count = offer_counts[0] if len(offer_counts) > 0 else 0
         used_offer_count = offer_counts[1] if len(offer_counts) > 1 else 0
 
         # Use the best available price (prefer Amazon, then new 3P)
         best_price = amazon_price or new_3p_price
-        category = product.get("categoryTree", [{}])
-        category_name = category[0].get("name", "") if category else ""
+        ct = product.get("categoryTree")
+        category_name = ct[0].get("name", "") if ct else ""
+        images = product.get("imagesCSV")
 
         return {
             "platform": "amazon",
@@ -128,13 +178,13 @@ class KeepaClient:
             "amazon_price": amazon_price,
             "new_3p_price": new_3p_price,
             "used_price": used_price,
-            "avg_price_30d": cents_to_dollars(avg_30) if avg_30 else None,
-            "avg_price_90d": cents_to_dollars(avg_90) if avg_90 else None,
+            "avg_price_30d": _cents_to_dollars(avg_30) if avg_30 else None,
+            "avg_price_90d": _cents_to_dollars(avg_90) if avg_90 else None,
             "bsr": bsr,
             "new_offer_count": new_offer_count,
             "used_offer_count": used_offer_count,
             "category": category_name,
-            "image_url": f"https://images-na.ssl-images-amazon.com/images/I/{product.get('imagesCSV', '').split(',')[0]}" if product.get("imagesCSV") else None,
+            "image_url": f"https://images-na.ssl-images-amazon.com/images/I/{images.split(',', 1)[0]}" if images else None,
             "url": f"https://www.amazon.com/dp/{product.get('asin', '')}",
             "fba_fees": product.get("fbaFees", {}),
             "extra_data": {
@@ -146,23 +196,21 @@ class KeepaClient:
         }
 
     async def _get_cached(self, key: str) -> dict | None:
+        cached = self._l1.get(key)
+        if cached is not None:
+            return cached
         try:
-            r = await self._get_redis()
-            raw = await r.get(key)
+            raw = await self._redis.get(key)
             if raw:
-                return json.loads(raw)
+                self._l1[key] = data = orjson.loads(raw)
+                return data
         except Exception:
             logger.debug("Cache miss/error for %s", key)
         return None
 
     async def _set_cached(self, key: str, data: dict):
+        self._l1[key] = data
         try:
-            r = await self._get_redis()
-            await r.set(key, json.dumps(data), ex=CACHE_TTL)
+            await self._redis.set(key, orjson.dumps(data), ex=CACHE_TTL)
         except Exception:
             logger.debug("Cache set error for %s", key)
-
-    async def close(self):
-        await self._http.aclose()
-        if self._redis:
-            await self._redis.aclose()
@@ -2,16 +2,24 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
+from app.cache import get_redis
 from app.config import get_settings
+from app.api.events import OpportunityFeed
 from app.api.routes import router as api_router
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    app.state.redis = get_redis()
+    app.state.opportunity_feed = OpportunityFeed(app.state.redis)
+    app.state.opportunity_feed.start()
     yield
     # Shutdown
+    await app.state.opportunity_feed.stop()
+    await app.state.redis.aclose()
 
 
 settings = get_settings()
@@ -21,6 +29,7 @@ app = FastAPI(
     description="Monitor MacBid auctions and find profitable resale opportunities",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -29,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router, prefix="/api")
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Text, Numeric, DateTime, Boolean, ForeignKey, func
+from sqlalchemy import String, Text, Numeric, DateTime, Boolean, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -30,3 +30,7 @@ class AlertHistory(Base):
     email: Mapped[str] = mapped_column(String(255), nullable=False)
     subject: Mapped[str] = mapped_column(Text, nullable=False)
     sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+# Backs the already-sent anti-join in the alert task
+Index("idx_alert_history_setting_opp", AlertHistory.alert_setting_id, AlertHistory.opportunity_id)
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from enum import Enum as PyEnum
 
-from sqlalchemy import String, Text, Numeric, DateTime, Enum, ForeignKey, func
+from sqlalchemy import String, Text, Numeric, DateTime, Enum, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -43,3 +43,13 @@ class MacBidListing(Base):
 
     product: Mapped["Product"] = relationship(back_populates="listings")
     opportunities: Mapped[list["Opportunity"]] = relationship(back_populates="macbid_listing")
+
+
+# Backs GET /listings?status=... ordered by newest first; id breaks ties for
+# the keyset cursor
+Index(
+    "idx_listing_status_created",
+    MacBidListing.status,
+    MacBidListing.created_at.desc(),
+    MacBidListing.id.desc(),
+)
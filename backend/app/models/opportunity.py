@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Numeric, DateTime, ForeignKey, func
+from sqlalchemy import String, Numeric, DateTime, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -27,3 +27,17 @@ class Opportunity(Base):
 
     product: Mapped["Product"] = relationship(back_populates="opportunities")
     macbid_listing: Mapped["MacBidListing"] = relationship(back_populates="opportunities")
+
+
+# Indexes backing the sort/filter options of GET /opportunities. Keyset pages
+# order by (sort column, id), so id is part of each key as the tie-breaker.
+Index(
+    "idx_opp_profit_desc",
+    Opportunity.profit.desc(),
+    Opportunity.id.desc(),
+    postgresql_include=["product_id", "macbid_listing_id", "roi_pct", "sell_platform", "created_at"],
+)
+Index("idx_opp_roi_desc", Opportunity.roi_pct.desc(), Opportunity.id.desc())
+Index("idx_opp_confidence_desc", Opportunity.confidence_score.desc(), Opportunity.id.desc())
+Index("idx_opp_created_desc", Opportunity.created_at.desc(), Opportunity.id.desc())
+Index("idx_opp_platform_profit", Opportunity.sell_platform, Opportunity.profit.desc(), Opportunity.id.desc())
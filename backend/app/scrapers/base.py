@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
 
@@ -15,17 +16,37 @@ class BaseScraper(ABC):
     async def scrape(self) -> list[dict]:
         """Run the scraper and return a list of raw item dicts."""
 
-    async def run(self) -> list[dict]:
-        for attempt in range(1, MAX_RETRIES + 1):
+    async def stream(self):
+        """Yield the items of one scrape attempt.
+
+        Scrapers that can stream override this; by default it yields the
+        result of ``scrape()``.
+        """
+        for item in await self.scrape():
+            yield item
+
+    async def iter_items(self):
+        """Yield scraped items as they arrive, retrying failed attempts.
+
+        A retry starts the scrape over; listings an earlier attempt already
+        yielded are skipped, so each one is yielded once.
+        """
+        seen_ids: set[str] = set()
+        max_retries = MAX_RETRIES
+        for attempt in range(1, max_retries + 1):
             try:
-                self.logger.info("Scrape attempt %d/%d", attempt, MAX_RETRIES)
-                results = await self.scrape()
-                self.logger.info("Scraped %d items", len(results))
-                return results
+                self.logger.info("Scrape attempt %d/%d", attempt, max_retries)
+                async for item in self.stream():
+                    if item["listing_id"] not in seen_ids:
+                        seen_ids.add(item["listing_id"])
+                        yield item
+                self.logger.info("Scraped %d items", len(seen_ids))
+                return
             except Exception:
                 self.logger.exception("Scrape attempt %d failed", attempt)
-                if attempt == MAX_RETRIES:
+                if attempt == max_retries:
                     raise
-                import asyncio
                 await asyncio.sleep(RETRY_DELAY * attempt)
-        return []
+
+    async def run(self) -> list[dict]:
+        return [item async for item in self.iter_items()]
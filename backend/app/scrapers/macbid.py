@@ -1,15 +1,59 @@
-import json
+import asyncio
 import logging
+import re
 from datetime import datetime, timezone
 
-from playwright.async_api import async_playwright
+import orjson
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright
 
 from app.scrapers.base import BaseScraper
 from app.config import get_settings
+from app.integrations.http import get_http_client
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+MAX_SCROLLS = 20  # upper bound on lazy-load rounds per page
+SCROLL_GROWTH_TIMEOUT = 3000  # ms to wait for a scroll to load more lots
+API_CONCURRENCY = 16  # API page requests in flight at once
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/131.0.0.0 Safari/537.36"
+)
+
+
+# Raw condition strings seen on MacBid -> ItemCondition values
+CONDITION_MAP = {
+    "new": "new",
+    "like new": "like_new",
+    "like_new": "like_new",
+    "open box": "open_box",
+    "open_box": "open_box",
+    "damaged": "damaged",
+    "salvage": "damaged",
+}
+
+# Field names the listing id and title have appeared under, in priority order
+LISTING_ID_KEYS = ("id", "lotId", "lot_id", "auctionId")
+TITLE_KEYS = ("title", "name", "description")
+
+_PRICE_RE = re.compile(r"[$,\s]")
+
+
+def _first_present(raw: dict, keys: tuple[str, ...]):
+    for key in keys:
+        value = raw.get(key)
+        if value:
+            return value
+    return None
+
+
+class MacBidApiUnavailable(Exception):
+    """The MacBid API can't be scraped directly: it refused the request or
+    answered with something other than the listings we expect."""
+
 
 class MacBidScraper(BaseScraper):
     """Scrape mac.bid auction listings using Playwright.
@@ -26,66 +70,95 @@ class MacBidScraper(BaseScraper):
         items: list[dict] = []
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent=(
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/131.0.0.0 Safari/537.36"
-                )
-            )
+            # One context for every page so they share cookies and connections
+            context = await browser.new_context(user_agent=USER_AGENT)
 
-            # Intercept API responses for auction data
-            api_responses: list[dict] = []
+            # Items are collected as they arrive, deduped by listing id
+            seen_ids: set[str] = set()
+
+            def add_items(new_items: list[dict]):
+                for item in new_items:
+                    if item["listing_id"] not in seen_ids:
+                        seen_ids.add(item["listing_id"])
+                        items.append(item)
 
+            # Intercept API responses for auction data, including the ones
+            # fired by lazy loading while we scroll
             async def handle_response(response):
                 url = response.url
                 if "api.macdiscount.com" in url and "auction" in url.lower():
                     try:
-                        data = await response.json()
-                        api_responses.append(data)
+                        data = orjson.loads(await response.body())
+                        add_items(self._parse_api_response(data))
                     except Exception:
                         pass
 
-            page = await context.new_page()
-            page.on("response", handle_response)
-
-            # Navigate to the main auction listing page
-            await page.goto(f"{self.BASE_URL}/auctions", wait_until="networkidle", timeout=30000)
-
-            # Extract __NEXT_DATA__ from the page
-            next_data = await self._extract_next_data(page)
-            if next_data:
-                items.extend(self._parse_next_data(next_data))
-
-            # Also parse any intercepted API responses
-            for api_data in api_responses:
-                items.extend(self._parse_api_response(api_data))
-
-            # Scroll to trigger lazy-loaded content
-            for _ in range(5):
-                await page.evaluate("window.scrollBy(0, window.innerHeight)")
-                await page.wait_for_timeout(1000)
-
-            # Re-extract after scrolling
-            next_data = await self._extract_next_data(page)
-            if next_data:
-                new_items = self._parse_next_data(next_data)
-                existing_ids = {i["listing_id"] for i in items}
-                for item in new_items:
-                    if item["listing_id"] not in existing_ids:
-                        items.append(item)
+            context.on("response", handle_response)
+
+            # Scrape the paginated auction listing concurrently
+            sem = asyncio.Semaphore(settings.macbid_page_concurrency)
+            urls = [
+                f"{self.BASE_URL}/auctions?page={n}"
+                for n in range(1, settings.macbid_max_pages + 1)
+            ]
+            results = await asyncio.gather(
+                *(self._scrape_page(context, url, sem, add_items) for url in urls),
+                return_exceptions=True,
+            )
 
             await browser.close()
 
+        # A failed page only loses its own lots; retry the run if all failed
+        failures = []
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                logger.error("Failed to scrape %s: %r", url, result)
+                failures.append(result)
+        if len(failures) == len(urls):
+            raise failures[0]
+
         logger.info("MacBid scrape complete: %d items found", len(items))
         return items
 
+    async def _scrape_page(self, context, url: str, sem: asyncio.Semaphore, add_items):
+        async with sem:
+            page = await context.new_page()
+            try:
+                # Wait for the SSR payload itself rather than for the network
+                # to go idle, which analytics and polling can hold off for seconds
+                await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                try:
+                    await page.wait_for_selector("script#__NEXT_DATA__", state="attached", timeout=15000)
+                except PlaywrightTimeoutError:
+                    logger.warning("__NEXT_DATA__ did not appear on %s", url)
+
+                # Extract __NEXT_DATA__ from the page. Client-side scrolling
+                # doesn't change it, so it is only read once.
+                next_data = await self._extract_next_data(page)
+                if next_data:
+                    add_items(self._parse_next_data(next_data))
+
+                # Scroll to trigger lazy-loaded content until the page stops growing
+                for _ in range(MAX_SCROLLS):
+                    height = await page.evaluate("document.body.scrollHeight")
+                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                    try:
+                        await page.wait_for_function(
+                            "h => document.body.scrollHeight > h",
+                            arg=height,
+                            timeout=SCROLL_GROWTH_TIMEOUT,
+                        )
+                    except PlaywrightTimeoutError:
+                        break
+            finally:
+                await page.close()
+
     async def _extract_next_data(self, page) -> dict | None:
         try:
             element = await page.query_selector("script#__NEXT_DATA__")
             if element:
                 raw = await element.inner_text()
-                return json.loads(raw)
+                return orjson.loads(raw)
         except Exception:
             logger.exception("Failed to extract __NEXT_DATA__")
         return None
@@ -139,17 +212,11 @@ class MacBidScraper(BaseScraper):
         if not isinstance(raw, dict):
             return None
 
-        listing_id = str(
-            raw.get("id")
-            or raw.get("lotId")
-            or raw.get("lot_id")
-            or raw.get("auctionId")
-            or ""
-        )
+        listing_id = str(_first_present(raw, LISTING_ID_KEYS) or "")
         if not listing_id:
             return None
 
-        title = raw.get("title") or raw.get("name") or raw.get("description") or ""
+        title = _first_present(raw, TITLE_KEYS) or ""
 
         current_bid = self._parse_price(
             raw.get("currentBid")
@@ -169,16 +236,7 @@ class MacBidScraper(BaseScraper):
         condition_raw = str(
             raw.get("condition") or raw.get("itemCondition") or "unknown"
         ).lower()
-        condition_map = {
-            "new": "new",
-            "like new": "like_new",
-            "like_new": "like_new",
-            "open box": "open_box",
-            "open_box": "open_box",
-            "damaged": "damaged",
-            "salvage": "damaged",
-        }
-        condition = condition_map.get(condition_raw, "unknown")
+        condition = CONDITION_MAP.get(condition_raw, "unknown")
 
         upc = raw.get("upc") or raw.get("barcode") or raw.get("UPC")
         image_url = raw.get("imageUrl") or raw.get("image") or raw.get("primaryImage")
@@ -219,7 +277,7 @@ class MacBidScraper(BaseScraper):
         if isinstance(val, (int, float)):
             return float(val)
         if isinstance(val, str):
-            cleaned = val.replace("$", "").replace(",", "").strip()
+            cleaned = _PRICE_RE.sub("", val)
             try:
                 return float(cleaned)
             except ValueError:
@@ -227,3 +285,59 @@ class MacBidScraper(BaseScraper):
         if isinstance(val, dict):
             return float(val.get("amount", 0))
         return None
+
+
+class MacBidApiScraper(MacBidScraper):
+    """Fetch mac.bid listings straight from the JSON API the site calls.
+
+    Skips launching a browser entirely. If the API answers with any non-2xx
+    status, or its first page holds no listings we can read (the endpoint
+    moved or changed shape), falls back to the Playwright scraper, which is
+    the inherited ``scrape()``.
+    """
+
+    async def stream(self):
+        """Yield listings page by page as the API responses come back."""
+        http = get_http_client()
+        sem = asyncio.Semaphore(API_CONCURRENCY)
+        fetches = [
+            asyncio.ensure_future(self._fetch_page(http, n, sem))
+            for n in range(1, settings.macbid_max_pages + 1)
+        ]
+        unavailable = None
+        try:
+            for next_page in asyncio.as_completed(fetches):
+                try:
+                    page_items = await next_page
+                except MacBidApiUnavailable as exc:
+                    unavailable = exc
+                    break
+                for item in page_items:
+                    yield item
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+
+        if unavailable is not None:
+            logger.warning("MacBid API unusable (%s), falling back to Playwright", unavailable)
+            for item in await self.scrape():
+                yield item
+
+    async def _fetch_page(self, http, page: int, sem: asyncio.Semaphore) -> list[dict]:
+        async with sem:
+            resp = await http.get(
+                settings.macbid_api_url,
+                params={"page": page},
+                headers={"User-Agent": USER_AGENT, "Accept": "application/json"},
+            )
+        if not resp.is_success:
+            raise MacBidApiUnavailable(f"page {page} returned HTTP {resp.status_code}")
+        try:
+            items = self._parse_api_response(orjson.loads(resp.content))
+        except orjson.JSONDecodeError:
+            raise MacBidApiUnavailable(f"page {page} is not JSON")
+        # Later pages run out once the listings do; an empty first page means
+        # the response isn't in a shape _parse_api_response knows
+        if page == 1 and not items:
+            raise MacBidApiUnavailable("page 1 has no recognizable listings")
+        return items
@@ -0,0 +1,52 @@
+"""Bulk ingest of scraped MacBid listings."""
+
+import logging
+
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.listing import MacBidListing
+
+logger = logging.getLogger(__name__)
+
+
+def _upsert_statement():
+    # New listings are inserted whole; existing ones only take the fresh bid
+    # and, when the scrape had one, the closing time. Listings whose bid and
+    # closing time haven't moved are left alone so they don't churn out dead
+    # tuples.
+    table = MacBidListing.__table__
+    stmt = pg_insert(table)
+    closes_at = func.coalesce(stmt.excluded.closes_at, table.c.closes_at)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.listing_id],
+        set_={
+            "current_bid": stmt.excluded.current_bid,
+            "closes_at": closes_at,
+            "updated_at": func.now(),
+        },
+        where=or_(
+            table.c.current_bid.is_distinct_from(stmt.excluded.current_bid),
+            table.c.closes_at.is_distinct_from(closes_at),
+        ),
+    ).returning(table.c.listing_id, literal_column("(xmax = 0)").label("inserted"))
+
+
+_UPSERT = _upsert_statement()
+
+
+async def bulk_upsert_listings(db: AsyncSession, rows: list[dict]) -> set[str]:
+    """Upsert listing rows with one multi-row ``INSERT ... ON CONFLICT``.
+
+    Each row holds ``macbid_listings`` column values, with enum columns given
+    as their member names. Runs inside the session's transaction. Returns
+    the ``listing_id`` values that were newly inserted.
+    """
+    if not rows:
+        return set()
+
+    result = await db.execute(_UPSERT, rows)
+    inserted = {row.listing_id for row in result if row.inserted}
+    logger.info("Upserted %d listings (%d new)", len(rows), len(inserted))
+    return inserted
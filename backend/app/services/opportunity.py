@@ -1,177 +1,197 @@
 """Opportunity engine: compares MacBid listings against platform prices to find arbitrage."""
 
 import logging
-import uuid
 from datetime import datetime, timezone, timedelta
 
-from sqlalchemy import select
+from sqlalchemy import Numeric, String, case, cast, delete, func, insert, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.listing import MacBidListing, AuctionStatus
-from app.models.price import PlatformPrice
+from app.models.price import Platform, PlatformPrice
 from app.models.opportunity import Opportunity
-from app.services.calculator import calculate_profit
+from app.config import get_settings
+from app.services.calculator import (
+    AMAZON_FEE_RATES,
+    EBAY_FVF_RATE,
+    EBAY_PER_ORDER_FEE,
+    FBA_SMALL_STANDARD,
+    MACBID_BUYER_PREMIUM,
+    MACBID_LOT_FEE,
+)
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _price_stats_query(product_ids, since: datetime):
+    return (
+        select(
+            PlatformPrice.product_id,
+            PlatformPrice.platform,
+            func.percentile_cont(0.5).within_group(PlatformPrice.price.asc()).label("median_price"),
+            func.avg(PlatformPrice.shipping_cost).label("avg_shipping"),
+            func.max(PlatformPrice.fetched_at).label("newest"),
+            func.count().label("price_count"),
+        )
+        .where(PlatformPrice.product_id.in_(product_ids))
+        .where(PlatformPrice.fetched_at >= since)
+        .group_by(PlatformPrice.product_id, PlatformPrice.platform)
+    )
 
 
-def compute_confidence_score(
-    price_count: int,
-    freshness_hours: float,
-    bsr: int | None = None,
-) -> float:
+def _latest_bsr_query(product_ids, since: datetime):
+    bsr_value = PlatformPrice.extra_data["bsr"].as_integer()
+    return (
+        select(PlatformPrice.product_id, bsr_value.label("bsr"))
+        .distinct(PlatformPrice.product_id)
+        .where(PlatformPrice.product_id.in_(product_ids))
+        .where(PlatformPrice.platform == Platform.AMAZON)
+        .where(PlatformPrice.fetched_at >= since)
+        .where(bsr_value != 0)
+        .order_by(PlatformPrice.product_id, PlatformPrice.fetched_at.desc())
+    )
+
+
+def _confidence_score_expr(price_count, freshness_hours, bsr):
     """Score 0-100 indicating how reliable the opportunity estimate is.
 
     Factors:
     - Number of comparable prices found (more = better)
     - How recent the price data is (fresher = better)
-    - BSR rank for Amazon (lower = better selling)
+    - BSR rank for Amazon (lower = better selling; neutral when unknown)
     """
-    score = 0.0
-
-    # Price data quantity (up to 40 points)
-    if price_count >= 10:
-        score += 40
-    elif price_count >= 5:
-        score += 30
-    elif price_count >= 3:
-        score += 20
-    elif price_count >= 1:
-        score += 10
-
-    # Freshness (up to 30 points)
-    if freshness_hours <= 2:
-        score += 30
-    elif freshness_hours <= 6:
-        score += 25
-    elif freshness_hours <= 12:
-        score += 20
-    elif freshness_hours <= 24:
-        score += 10
-    else:
-        score += 5
-
-    # BSR (up to 30 points) - lower BSR = better
-    if bsr is not None:
-        if bsr <= 5000:
-            score += 30
-        elif bsr <= 20000:
-            score += 25
-        elif bsr <= 50000:
-            score += 20
-        elif bsr <= 100000:
-            score += 15
-        elif bsr <= 500000:
-            score += 10
-        else:
-            score += 5
-    else:
-        score += 15  # neutral when no BSR data
-
-    return min(score, 100)
-
-
-async def compute_opportunities_for_listing(
-    db: AsyncSession,
-    listing: MacBidListing,
-) -> list[Opportunity]:
-    """Compute arbitrage opportunities for a single MacBid listing."""
-    product_id = listing.product_id
-    now = datetime.now(timezone.utc)
-
-    # Get all platform prices for this product
-    result = await db.execute(
-        select(PlatformPrice)
-        .where(PlatformPrice.product_id == product_id)
-        .where(PlatformPrice.fetched_at >= now - timedelta(hours=48))
-        .order_by(PlatformPrice.fetched_at.desc())
+    price_points = case(
+        (price_count >= 10, 40),
+        (price_count >= 5, 30),
+        (price_count >= 3, 20),
+        (price_count >= 1, 10),
+        else_=0,
     )
-    prices = result.scalars().all()
-
-    if not prices:
-        return []
-
-    # Group prices by platform
-    platform_prices: dict[str, list[PlatformPrice]] = {}
-    for p in prices:
-        platform_prices.setdefault(p.platform.value, []).append(p)
-
-    opportunities = []
-
-    for platform, price_list in platform_prices.items():
-        # Use median price as the estimated sell price for robustness
-        sorted_prices = sorted(price_list, key=lambda x: float(x.price))
-        mid = len(sorted_prices) // 2
-        median_price = float(sorted_prices[mid].price)
-
-        # Average shipping cost
-        avg_shipping = sum(float(p.shipping_cost) for p in price_list) / len(price_list)
-
-        # Get freshness
-        newest = max(p.fetched_at for p in price_list)
-        freshness_hours = (now - newest).total_seconds() / 3600
-
-        # Get BSR if available (from extra_data on Amazon prices)
-        bsr = None
-        if platform == "amazon":
-            for p in price_list:
-                if p.extra_data and p.extra_data.get("bsr"):
-                    bsr = p.extra_data["bsr"]
-                    break
-
-        # Calculate profit
-        result = calculate_profit(
-            winning_bid=float(listing.current_bid),
-            sell_price=median_price,
-            platform=platform,
-            shipping_cost=round(avg_shipping, 2),
-        )
+    freshness_points = case(
+        (freshness_hours <= 2, 30),
+        (freshness_hours <= 6, 25),
+        (freshness_hours <= 12, 20),
+        (freshness_hours <= 24, 10),
+        else_=5,
+    )
+    bsr_points = case(
+        (bsr.is_(None), 15),
+        (bsr <= 5000, 30),
+        (bsr <= 20000, 25),
+        (bsr <= 50000, 20),
+        (bsr <= 100000, 15),
+        (bsr <= 500000, 10),
+        else_=5,
+    )
+    return func.least(price_points + freshness_points + bsr_points, 100)
 
-        confidence = compute_confidence_score(
-            price_count=len(price_list),
-            freshness_hours=freshness_hours,
-            bsr=bsr,
-        )
 
-        opp = Opportunity(
-            id=uuid.uuid4(),
-            product_id=product_id,
-            macbid_listing_id=listing.id,
-            buy_cost=result.cost.total_cost,
-            estimated_sell_price=median_price,
-            sell_platform=platform,
-            platform_fees=result.revenue.platform_fees,
-            shipping_cost=result.revenue.shipping_cost,
-            profit=result.profit,
-            roi_pct=result.roi_pct,
-            confidence_score=confidence,
-        )
-        opportunities.append(opp)
-
-    return opportunities
+async def refresh_all_opportunities(db: AsyncSession) -> list[dict]:
+    """Recompute opportunities for all active listings entirely in Postgres.
 
+    The aggregation, fee math and scoring run as one ``INSERT ... SELECT``
+    with no rows round-tripping through Python. Returns the fields the SSE
+    feed publishes for each new opportunity.
+    """
+    now = datetime.now(timezone.utc)
+    since = now - timedelta(hours=48)
+
+    active = select(MacBidListing).where(MacBidListing.status == AuctionStatus.ACTIVE)
+    active_ids = active.with_only_columns(MacBidListing.id)
+    active_product_ids = active.with_only_columns(MacBidListing.product_id)
+
+    stats = _price_stats_query(active_product_ids, since).cte("price_stats")
+    latest_bsr = _latest_bsr_query(active_product_ids, since).cte("latest_bsr")
+
+    # Fee math from app.services.calculator, as column arithmetic. The
+    # refresh always prices with the default Amazon category and small FBA.
+    # Constants are bound as unconstrained NUMERIC so Postgres neither rounds
+    # them to the money columns' scale nor switches to float arithmetic.
+    def num(value):
+        return literal(value, Numeric())
+
+    bid = MacBidListing.current_bid
+    buyer_premium = bid * num(MACBID_BUYER_PREMIUM)
+    tax = (bid + buyer_premium) * num(settings.default_tax_rate)
+    total_cost = func.round(bid + buyer_premium + num(MACBID_LOT_FEE) + tax, 2)
+    median_price = func.round(cast(stats.c.median_price, Numeric), 2)
+    shipping = func.round(func.coalesce(stats.c.avg_shipping, 0), 2)
+    fees = case(
+        (
+            stats.c.platform == Platform.EBAY,
+            median_price * num(EBAY_FVF_RATE) + num(EBAY_PER_ORDER_FEE),
+        ),
+        (
+            stats.c.platform == Platform.AMAZON,
+            median_price * num(AMAZON_FEE_RATES["default"]) + num(FBA_SMALL_STANDARD),
+        ),
+        else_=0,
+    )
+    bsr = case((stats.c.platform == Platform.AMAZON, latest_bsr.c.bsr))
+    freshness_hours = func.extract("epoch", literal(now) - stats.c.newest) / 3600
+
+    priced = (
+        select(
+            MacBidListing.id.label("macbid_listing_id"),
+            MacBidListing.product_id,
+            func.lower(cast(stats.c.platform, String)).label("sell_platform"),
+            total_cost.label("buy_cost"),
+            median_price.label("estimated_sell_price"),
+            func.round(fees, 2).label("platform_fees"),
+            shipping.label("shipping_cost"),
+            func.round(median_price - fees - shipping, 2).label("net_revenue"),
+            _confidence_score_expr(stats.c.price_count, freshness_hours, bsr).label("confidence_score"),
+        )
+        .join(stats, stats.c.product_id == MacBidListing.product_id)
+        .outerjoin(latest_bsr, latest_bsr.c.product_id == MacBidListing.product_id)
+        .where(MacBidListing.status == AuctionStatus.ACTIVE)
+        .subquery("priced")
+    )
+    profit = func.round(priced.c.net_revenue - priced.c.buy_cost, 2)
+    roi_pct = case(
+        (priced.c.buy_cost > 0, func.round(profit / priced.c.buy_cost * 100, 2)),
+        else_=0,
+    )
 
-async def refresh_all_opportunities(db: AsyncSession) -> int:
-    """Recompute opportunities for all active MacBid listings."""
-    result = await db.execute(
-        select(MacBidListing).where(MacBidListing.status == AuctionStatus.ACTIVE)
+    columns = [
+        "id", "product_id", "macbid_listing_id", "buy_cost", "estimated_sell_price",
+        "sell_platform", "platform_fees", "shipping_cost", "profit", "roi_pct",
+        "confidence_score",
+    ]
+    rows = select(
+        func.gen_random_uuid(),
+        priced.c.product_id,
+        priced.c.macbid_listing_id,
+        priced.c.buy_cost,
+        priced.c.estimated_sell_price,
+        priced.c.sell_platform,
+        priced.c.platform_fees,
+        priced.c.shipping_cost,
+        profit,
+        roi_pct,
+        priced.c.confidence_score,
     )
-    listings = result.scalars().all()
 
-    count = 0
-    for listing in listings:
-        # Delete stale opportunities for this listing
-        old = await db.execute(
-            select(Opportunity).where(Opportunity.macbid_listing_id == listing.id)
+    await db.execute(
+        delete(Opportunity)
+        .where(Opportunity.macbid_listing_id.in_(active_ids))
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(
+        insert(Opportunity)
+        .from_select(columns, rows)
+        .returning(
+            Opportunity.id,
+            Opportunity.product_id,
+            Opportunity.profit,
+            Opportunity.roi_pct,
+            Opportunity.sell_platform,
+            Opportunity.buy_cost,
+            Opportunity.estimated_sell_price,
         )
-        for opp in old.scalars().all():
-            await db.delete(opp)
-
-        new_opps = await compute_opportunities_for_listing(db, listing)
-        for opp in new_opps:
-            db.add(opp)
-            count += 1
+    )
+    created = [dict(row) for row in result.mappings()]
 
     await db.commit()
-    logger.info("Refreshed %d opportunities across %d listings", count, len(listings))
-    return count
+    logger.info("Refreshed %d opportunities in SQL", len(created))
+    return created
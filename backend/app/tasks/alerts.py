@@ -5,138 +5,218 @@ import logging
 import uuid
 from datetime import datetime, timezone, timedelta
 
-import resend
-from sqlalchemy import select, and_
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import insert, select, and_
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import selectinload
 
 from app.celery_config import celery_app
 from app.config import get_settings
+from app.integrations.http import get_http_client
 from app.models.alert import AlertSetting, AlertHistory
 from app.models.opportunity import Opportunity
-from app.models.product import Product
-from app.models.listing import MacBidListing
+from app.tasks.db import get_session_factory, run
+from app.tasks.locks import single_flight
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+RESEND_API_BASE = "https://api.resend.com"
+RESEND_BATCH_SIZE = 100  # max emails per Resend batch request
+RESEND_CONCURRENCY = 16  # Resend requests in flight at once
+ALERT_CONCURRENCY = 10  # alerts matched at once; each holds a DB connection
 
-async def _check_and_send():
-    engine = create_async_engine(settings.database_url)
-    Session = async_sessionmaker(engine, expire_on_commit=False)
-
-    if not settings.resend_api_key:
-        logger.debug("Resend API key not configured, skipping alerts")
-        return
-
-    resend.api_key = settings.resend_api_key
-
-    async with Session() as db:
-        # Get all active alert settings
-        result = await db.execute(
-            select(AlertSetting).where(AlertSetting.is_active == True)
-        )
-        alert_settings = result.scalars().all()
-
-        for alert in alert_settings:
-            # Find opportunities matching this alert's thresholds
-            query = select(Opportunity).where(
-                and_(
-                    Opportunity.profit >= float(alert.min_profit),
-                    Opportunity.roi_pct >= float(alert.min_roi),
-                )
-            )
-            result = await db.execute(query)
-            opportunities = result.scalars().all()
-
-            for opp in opportunities:
-                # Check if we already sent an alert for this opportunity
-                existing = await db.execute(
-                    select(AlertHistory).where(
-                        and_(
-                            AlertHistory.alert_setting_id == alert.id,
-                            AlertHistory.opportunity_id == opp.id,
-                        )
-                    )
-                )
-                if existing.scalar_one_or_none():
-                    continue
-
-                # Get product and listing details for the email
-                product = await db.get(Product, opp.product_id)
-                listing = await db.get(MacBidListing, opp.macbid_listing_id)
-
-                if not product or not listing:
-                    continue
-
-                # Send email
-                subject = f"Arbitrage Alert: ${opp.profit:.2f} profit ({opp.roi_pct:.0f}% ROI) - {product.title[:50]}"
-                html = _build_alert_email(product, listing, opp)
-
-                try:
-                    resend.Emails.send({
-                        "from": settings.alert_from_email,
-                        "to": alert.email,
-                        "subject": subject,
-                        "html": html,
-                    })
-
-                    # Record that we sent this alert
-                    history = AlertHistory(
-                        id=uuid.uuid4(),
-                        alert_setting_id=alert.id,
-                        opportunity_id=opp.id,
-                        email=alert.email,
-                        subject=subject,
-                    )
-                    db.add(history)
-                    logger.info("Sent alert to %s for opportunity %s", alert.email, opp.id)
-                except Exception:
-                    logger.exception("Failed to send alert email to %s", alert.email)
-
-        await db.commit()
-
-
-def _build_alert_email(product, listing, opp) -> str:
-    return f"""
+# Static pieces of the alert email; _build_alert_email interleaves the values
+_ALERT_EMAIL_PARTS = tuple("""
     <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
         <h2 style="color: #16a34a;">Arbitrage Opportunity Found!</h2>
         <div style="background: #f9fafb; border-radius: 8px; padding: 16px; margin: 16px 0;">
-            <h3>{product.title}</h3>
+            <h3>{}</h3>
             <table style="width: 100%; border-collapse: collapse;">
                 <tr>
                     <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;"><strong>MacBid Current Bid</strong></td>
-                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${float(listing.current_bid):.2f}</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${}</td>
                 </tr>
                 <tr>
                     <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;"><strong>Total Buy Cost</strong></td>
-                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${float(opp.buy_cost):.2f}</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${}</td>
                 </tr>
                 <tr>
-                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;"><strong>Est. Sell Price ({opp.sell_platform})</strong></td>
-                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${float(opp.estimated_sell_price):.2f}</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;"><strong>Est. Sell Price ({})</strong></td>
+                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${}</td>
                 </tr>
                 <tr>
                     <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;"><strong>Platform Fees</strong></td>
-                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${float(opp.platform_fees):.2f}</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">${}</td>
                 </tr>
                 <tr style="background: #dcfce7;">
                     <td style="padding: 8px;"><strong>Estimated Profit</strong></td>
-                    <td style="padding: 8px;"><strong style="color: #16a34a;">${float(opp.profit):.2f}</strong></td>
+                    <td style="padding: 8px;"><strong style="color: #16a34a;">${}</strong></td>
                 </tr>
                 <tr style="background: #dcfce7;">
                     <td style="padding: 8px;"><strong>ROI</strong></td>
-                    <td style="padding: 8px;"><strong style="color: #16a34a;">{float(opp.roi_pct):.1f}%</strong></td>
+                    <td style="padding: 8px;"><strong style="color: #16a34a;">{}%</strong></td>
                 </tr>
             </table>
         </div>
-        <a href="{listing.url}" style="display: inline-block; background: #2563eb; color: white; padding: 12px 24px; border-radius: 6px; text-decoration: none; margin-top: 8px;">
+        <a href="{}" style="display: inline-block; background: #2563eb; color: white; padding: 12px 24px; border-radius: 6px; text-decoration: none; margin-top: 8px;">
             View on MacBid
         </a>
     </div>
-    """
+    """.split("{}"))
+
+
+async def _check_and_send():
+    if not settings.resend_api_key:
+        logger.debug("Resend API key not configured, skipping alerts")
+        return
+
+    Session = get_session_factory()
+    async with Session() as db:
+        # Get all active alert settings
+        result = await db.execute(
+            select(AlertSetting).where(AlertSetting.is_active == True)
+        )
+        alert_settings = result.scalars().all()
+
+    # Alerts are independent, so match them concurrently, each in its own
+    # session; a session can't be shared between concurrent coroutines
+    alert_sem = asyncio.Semaphore(ALERT_CONCURRENCY)
+    per_alert = await asyncio.gather(
+        *(_process_alert(Session, alert, alert_sem) for alert in alert_settings)
+    )
+    pending = [entry for entries in per_alert for entry in entries]
+
+    sem = asyncio.Semaphore(RESEND_CONCURRENCY)
+    sent_chunks = await asyncio.gather(*(
+        _send_batch(pending[i:i + RESEND_BATCH_SIZE], sem)
+        for i in range(0, len(pending), RESEND_BATCH_SIZE)
+    ))
+    sent_history = [history for chunk in sent_chunks for history in chunk]
+
+    # Record the alerts that went out
+    if sent_history:
+        async with Session() as db:
+            await db.execute(insert(AlertHistory), sent_history)
+            await db.commit()
+    logger.info("Sent %d of %d alert emails", len(sent_history), len(pending))
+
+
+async def _process_alert(
+    Session: async_sessionmaker,
+    alert: AlertSetting,
+    sem: asyncio.Semaphore,
+) -> list[tuple[dict, dict]]:
+    """Build the (email, history row) pairs for one alert's new matches."""
+    pending: list[tuple[dict, dict]] = []
+    async with sem, Session() as db:
+        # Find opportunities matching this alert's thresholds
+        query = (
+            select(Opportunity)
+            .options(
+                selectinload(Opportunity.product),
+                selectinload(Opportunity.macbid_listing),
+            )
+            # Anti-join: skip opportunities this alert has already emailed
+            .outerjoin(
+                AlertHistory,
+                and_(
+                    AlertHistory.alert_setting_id == alert.id,
+                    AlertHistory.opportunity_id == Opportunity.id,
+                ),
+            )
+            .where(
+                and_(
+                    Opportunity.profit >= alert.min_profit,
+                    Opportunity.roi_pct >= alert.min_roi,
+                    AlertHistory.id.is_(None),
+                )
+            )
+        )
+        result = await db.execute(query)
+        opportunities = result.scalars().all()
+
+        for opp in opportunities:
+            # Product and listing details for the email were loaded with the query
+            product = opp.product
+            listing = opp.macbid_listing
+
+            if not product or not listing:
+                continue
+
+            # Queue the email and the history row recording it
+            subject = f"Arbitrage Alert: ${opp.profit:.2f} profit ({opp.roi_pct:.0f}% ROI) - {product.title[:50]}"
+            html = _build_alert_email(product, listing, opp)
+
+            pending.append((
+                {
+                    "from": settings.alert_from_email,
+                    "to": alert.email,
+                    "subject": subject,
+                    "html": html,
+                },
+                {
+                    "id": uuid.uuid4(),
+                    "alert_setting_id": alert.id,
+                    "opportunity_id": opp.id,
+                    "email": alert.email,
+                    "subject": subject,
+                },
+            ))
+    return pending
+
+
+async def _post_resend(path: str, payload) -> None:
+    resp = await get_http_client().post(
+        f"{RESEND_API_BASE}{path}",
+        json=payload,
+        headers={"Authorization": f"Bearer {settings.resend_api_key}"},
+    )
+    resp.raise_for_status()
+
+
+async def _send_one(email: dict, sem: asyncio.Semaphore) -> bool:
+    try:
+        async with sem:
+            await _post_resend("/emails", email)
+        return True
+    except Exception:
+        logger.exception("Failed to send alert email to %s", email["to"])
+        return False
+
+
+async def _send_batch(chunk: list[tuple[dict, dict]], sem: asyncio.Semaphore) -> list[dict]:
+    """Send a chunk of alert emails, returning the history rows of those sent."""
+    try:
+        async with sem:
+            await _post_resend("/emails/batch", [email for email, _ in chunk])
+        return [history for _, history in chunk]
+    except Exception:
+        logger.exception("Batch send of %d alert emails failed, sending individually", len(chunk))
+
+    sent = await asyncio.gather(*(_send_one(email, sem) for email, _ in chunk))
+    return [history for (_, history), ok in zip(chunk, sent) if ok]
+
+
+def _build_alert_email(product, listing, opp) -> str:
+    values = (
+        product.title,
+        f"{listing.current_bid:.2f}",
+        f"{opp.buy_cost:.2f}",
+        opp.sell_platform,
+        f"{opp.estimated_sell_price:.2f}",
+        f"{opp.platform_fees:.2f}",
+        f"{opp.profit:.2f}",
+        f"{opp.roi_pct:.1f}",
+        listing.url,
+    )
+    parts = [""] * (2 * len(values) + 1)
+    parts[::2] = _ALERT_EMAIL_PARTS
+    parts[1::2] = values
+    return "".join(parts)
 
 
 @celery_app.task(name="app.tasks.alerts.check_and_send_alerts")
+@single_flight("check_and_send_alerts", ttl=20 * 60)
 def check_and_send_alerts():
     """Check all alert settings against current opportunities and send notifications."""
-    asyncio.run(_check_and_send())
+    run(_check_and_send())
@@ -1,27 +1,70 @@
 """Celery tasks for computing arbitrage opportunities."""
 
-import asyncio
 import logging
+from decimal import Decimal
 
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import orjson
 
+from app.cache import (
+    DASHBOARD_STATS_FRESH_KEY,
+    DASHBOARD_STATS_KEY,
+    NEW_OPPORTUNITY_CHANNEL,
+    get_redis,
+)
 from app.celery_config import celery_app
-from app.config import get_settings
 from app.services.opportunity import refresh_all_opportunities
+from app.tasks.db import get_session_factory, run
+from app.tasks.locks import single_flight
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
 
 
 async def _refresh():
-    engine = create_async_engine(settings.database_url)
-    Session = async_sessionmaker(engine, expire_on_commit=False)
+    Session = get_session_factory()
     async with Session() as db:
-        count = await refresh_all_opportunities(db)
-        logger.info("Refreshed %d opportunities", count)
+        new_opps = await refresh_all_opportunities(db)
+        logger.info("Refreshed %d opportunities", len(new_opps))
+
+    await _publish_new_opportunities(new_opps)
+
+    # Drop the cached dashboard so the next request sees the new numbers
+    try:
+        await get_redis().delete(DASHBOARD_STATS_KEY, DASHBOARD_STATS_FRESH_KEY)
+    except Exception:
+        logger.warning("Failed to invalidate dashboard stats cache")
+
+
+def _json_default(obj):
+    # orjson handles UUIDs natively; Numeric columns may still be Decimals
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+async def _publish_new_opportunities(opps):
+    """Announce committed opportunities to the API's SSE stream."""
+    if not opps:
+        return
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for opp in opps:
+                data = {
+                    "id": opp["id"],
+                    "product_id": opp["product_id"],
+                    "profit": opp["profit"],
+                    "roi_pct": opp["roi_pct"],
+                    "sell_platform": opp["sell_platform"],
+                    "buy_cost": opp["buy_cost"],
+                    "estimated_sell_price": opp["estimated_sell_price"],
+                }
+                pipe.publish(NEW_OPPORTUNITY_CHANNEL, orjson.dumps(data, default=_json_default))
+            await pipe.execute()
+    except Exception:
+        logger.warning("Failed to publish %d new opportunities", len(opps))
 
 
 @celery_app.task(name="app.tasks.calculate.refresh_opportunities")
+@single_flight("refresh_opportunities", ttl=15 * 60)
 def refresh_opportunities():
     """Recompute arbitrage opportunities for all active listings."""
-    asyncio.run(_refresh())
+    run(_refresh())
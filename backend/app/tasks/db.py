@@ -0,0 +1,66 @@
+"""Event loop and database engine shared by the Celery tasks of a worker process."""
+
+import asyncio
+import threading
+
+from celery.signals import worker_process_init, worker_process_shutdown
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.db import make_engine
+from app.integrations.http import close_http_client
+
+_engine: AsyncEngine | None = None
+_Session: async_sessionmaker | None = None
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def get_session_factory() -> async_sessionmaker:
+    """Return the worker's sessionmaker, creating its engine on first use."""
+    global _engine, _Session
+    if _engine is None:
+        _engine = make_engine(pool_size=5, max_overflow=10, pool_recycle=300)
+        # Tasks write through explicit statements, so there is never pending
+        # ORM state worth flushing before a query
+        _Session = async_sessionmaker(_engine, expire_on_commit=False, autoflush=False)
+    return _Session
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="task-loop", daemon=True).start()
+    return _loop
+
+
+def run(coro):
+    """Run a task coroutine on the worker's event loop and wait for its result.
+
+    The loop lives as long as the worker process, so the database pool and
+    the loop-bound Redis and HTTP clients keep their connections between
+    tasks instead of reopening them for every run.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+@worker_process_init.connect
+def _init_worker(**kwargs):
+    # Nothing inherited from the parent survives a fork intact: its loop
+    # thread is gone and its engine's connections belong to the parent
+    global _engine, _Session, _loop
+    _engine = _Session = _loop = None
+    get_session_factory()
+    _get_loop()
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker(**kwargs):
+    if _loop is None:
+        return
+    if _engine is not None:
+        run(_engine.dispose())
+    run(close_http_client())
+    _loop.call_soon_threadsafe(_loop.stop)
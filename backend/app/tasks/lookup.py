@@ -5,122 +5,189 @@ import logging
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.celery_config import celery_app
 from app.config import get_settings
 from app.integrations.ebay import EbayClient
 from app.integrations.keepa import KeepaClient
+from app.models.listing import MacBidListing, AuctionStatus
 from app.models.product import Product
 from app.models.price import PlatformPrice, Platform
+from app.tasks.db import get_session_factory, run
+from app.tasks.locks import single_flight
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Kept for the life of the worker so the eBay OAuth token survives between
+# tasks; both sit on the shared HTTP and Redis clients of the task loop
+_ebay: EbayClient | None = None
+_keepa: KeepaClient | None = None
 
-def _get_async_session():
-    engine = create_async_engine(settings.database_url)
-    return async_sessionmaker(engine, expire_on_commit=False)
 
+def _get_ebay() -> EbayClient:
+    global _ebay
+    if _ebay is None:
+        _ebay = EbayClient()
+    return _ebay
 
-async def _lookup_ebay(product_id: str, upc: str | None, title: str):
-    ebay = EbayClient()
-    try:
-        results = []
-        if upc:
-            results = await ebay.search_by_upc(upc)
-        if not results and title:
-            # Fall back to keyword search
-            results = await ebay.search_by_keyword(title)
-
-        if not results:
-            return
 
-        Session = _get_async_session()
-        async with Session() as db:
-            for item in results:
-                price = PlatformPrice(
-                    id=uuid.uuid4(),
-                    product_id=uuid.UUID(product_id),
-                    platform=Platform.EBAY,
-                    price=item["price"],
-                    condition=item.get("condition"),
-                    shipping_cost=item.get("shipping_cost", 0),
-                    url=item.get("url"),
-                    seller_info=item.get("seller"),
-                    extra_data=item.get("extra_data"),
-                    fetched_at=datetime.now(timezone.utc),
-                )
-                db.add(price)
-            await db.commit()
-            logger.info("Stored %d eBay prices for product %s", len(results), product_id)
-    finally:
-        await ebay.close()
+def _get_keepa() -> KeepaClient:
+    global _keepa
+    if _keepa is None:
+        _keepa = KeepaClient()
+    return _keepa
+
 
+async def _fetch_ebay(upc: str | None, title: str) -> list[dict]:
+    ebay = _get_ebay()
+    results = []
+    if upc:
+        results = await ebay.search_by_upc(upc)
+    if not results and title:
+        # Fall back to keyword search
+        results = await ebay.search_by_keyword(title)
+    return results
 
-async def _lookup_keepa(product_id: str, upc: str | None):
+
+async def _fetch_keepa(upc: str | None) -> dict | None:
     if not settings.keepa_api_key:
         logger.debug("Keepa API key not configured, skipping")
+        return None
+
+    keepa = _get_keepa()
+    if upc:
+        return await keepa.lookup_by_upc(upc)
+    return None
+
+
+async def _store_ebay(db: AsyncSession, product_id: uuid.UUID, results: list[dict]):
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "product_id": product_id,
+            "platform": Platform.EBAY,
+            "price": item["price"],
+            "condition": item.get("condition"),
+            "shipping_cost": item.get("shipping_cost", 0),
+            "url": item.get("url"),
+            "seller_info": item.get("seller"),
+            "extra_data": item.get("extra_data"),
+            "fetched_at": now,
+        }
+        for item in results
+    ]
+    await db.execute(insert(PlatformPrice), rows)
+    logger.info("Stored %d eBay prices for product %s", len(results), product_id)
+
+
+def _amazon_price_row(product_id: uuid.UUID, result: dict, now: datetime) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "product_id": product_id,
+        "platform": Platform.AMAZON,
+        "price": result["price"],
+        "condition": "new",
+        "shipping_cost": 0,  # Amazon typically free shipping
+        "url": result.get("url"),
+        "extra_data": {
+            "asin": result.get("asin"),
+            "bsr": result.get("bsr"),
+            "avg_price_30d": result.get("avg_price_30d"),
+            "avg_price_90d": result.get("avg_price_90d"),
+            "new_offer_count": result.get("new_offer_count"),
+            "used_offer_count": result.get("used_offer_count"),
+            "fba_fees": result.get("fba_fees"),
+        },
+        "fetched_at": now,
+    }
+
+
+async def _store_keepa(db: AsyncSession, product_id: uuid.UUID, result: dict):
+    # Record the ASIN if the product doesn't have one yet
+    if result.get("asin"):
+        await db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.asin.is_(None))
+            .values(asin=result["asin"])
+        )
+
+    # Store the price
+    if result.get("price") is not None:
+        await db.execute(
+            insert(PlatformPrice),
+            [_amazon_price_row(product_id, result, datetime.now(timezone.utc))],
+        )
+    logger.info("Stored Keepa/Amazon price for product %s", product_id)
+
+
+async def _lookup_all(product_id: str, upc: str | None, title: str):
+    # Both APIs are queried at once; the results are then written through
+    # one session (AsyncSession isn't safe for concurrent use) and one commit
+    ebay_results, keepa_result = await asyncio.gather(
+        _fetch_ebay(upc, title),
+        _fetch_keepa(upc),
+    )
+    if not ebay_results and not keepa_result:
         return
 
-    keepa = KeepaClient()
-    try:
-        result = None
-        if upc:
-            result = await keepa.lookup_by_upc(upc)
-
-        if not result:
+    pid = uuid.UUID(product_id)
+    Session = get_session_factory()
+    async with Session() as db:
+        if ebay_results:
+            await _store_ebay(db, pid, ebay_results)
+        if keepa_result:
+            await _store_keepa(db, pid, keepa_result)
+        await db.commit()
+
+
+async def _refresh_amazon():
+    # Opportunities only count prices from the last 48 hours, so products
+    # still on auction need their Amazon price re-read while they're live.
+    # Their ASINs are already known, so Keepa takes them 100 per request.
+    Session = get_session_factory()
+    async with Session() as db:
+        result = await db.execute(
+            select(Product.id, Product.asin)
+            .join(MacBidListing, MacBidListing.product_id == Product.id)
+            .where(MacBidListing.status == AuctionStatus.ACTIVE, Product.asin.is_not(None))
+            .distinct()
+        )
+        products = result.all()
+        if not products:
             return
 
-        Session = _get_async_session()
-        async with Session() as db:
-            # Update product with ASIN if we found it
-            if result.get("asin"):
-                prod_result = await db.execute(
-                    select(Product).where(Product.id == uuid.UUID(product_id))
-                )
-                product = prod_result.scalar_one_or_none()
-                if product and not product.asin:
-                    product.asin = result["asin"]
-
-            # Store the price
-            if result.get("price") is not None:
-                price = PlatformPrice(
-                    id=uuid.uuid4(),
-                    product_id=uuid.UUID(product_id),
-                    platform=Platform.AMAZON,
-                    price=result["price"],
-                    condition="new",
-                    shipping_cost=0,  # Amazon typically free shipping
-                    url=result.get("url"),
-                    extra_data={
-                        "asin": result.get("asin"),
-                        "bsr": result.get("bsr"),
-                        "avg_price_30d": result.get("avg_price_30d"),
-                        "avg_price_90d": result.get("avg_price_90d"),
-                        "new_offer_count": result.get("new_offer_count"),
-                        "used_offer_count": result.get("used_offer_count"),
-                        "fba_fees": result.get("fba_fees"),
-                    },
-                    fetched_at=datetime.now(timezone.utc),
-                )
-                db.add(price)
-
+        found = await _get_keepa().lookup_many_asins(list({asin for _, asin in products}))
+        now = datetime.now(timezone.utc)
+        rows = [
+            _amazon_price_row(pid, found[asin], now)
+            for pid, asin in products
+            if found[asin] and found[asin].get("price") is not None
+        ]
+        if rows:
+            await db.execute(insert(PlatformPrice), rows)
             await db.commit()
-            logger.info("Stored Keepa/Amazon price for product %s", product_id)
-    finally:
-        await keepa.close()
+        logger.info("Refreshed Amazon prices for %d of %d products", len(rows), len(products))
 
 
 @celery_app.task(name="app.tasks.lookup.lookup_prices", bind=True, max_retries=2)
 def lookup_prices(self, product_id: str, upc: str | None, title: str):
     """Look up prices on eBay and Amazon for a product."""
     try:
-        asyncio.run(asyncio.gather(
-            _lookup_ebay(product_id, upc, title),
-            _lookup_keepa(product_id, upc),
-        ))
+        run(_lookup_all(product_id, upc, title))
     except Exception as exc:
         logger.exception("Price lookup failed for product %s", product_id)
         self.retry(exc=exc, countdown=120)
+
+
+@celery_app.task(name="app.tasks.lookup.refresh_amazon_prices")
+@single_flight("refresh_amazon_prices", ttl=30 * 60)
+def refresh_amazon_prices():
+    """Re-read Amazon prices for every product with an active listing and a known ASIN."""
+    if not settings.keepa_api_key:
+        logger.debug("Keepa API key not configured, skipping")
+        return
+    run(_refresh_amazon())
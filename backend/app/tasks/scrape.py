@@ -5,103 +5,223 @@ import logging
 import uuid
 
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.celery_config import celery_app
-from app.config import get_settings
-from app.scrapers.macbid import MacBidScraper
+from app.scrapers.macbid import MacBidApiScraper
+from app.services.ingest import bulk_upsert_listings
+from app.tasks.calculate import refresh_opportunities
+from app.tasks.db import get_session_factory, run
+from app.tasks.locks import latch_add, latch_done, single_flight
+from app.tasks.lookup import lookup_prices
 from app.models.product import Product
 from app.models.listing import MacBidListing, AuctionStatus, ItemCondition
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
 
 
-def _get_async_session():
-    engine = create_async_engine(settings.database_url)
-    return async_sessionmaker(engine, expire_on_commit=False)
+# Scraped items stored per persist_scrape_chunk task
+SCRAPE_CHUNK_SIZE = 200
+
+# Scraped condition value -> ItemCondition; anything else is UNKNOWN
+_COND = {member.value: member for member in ItemCondition}
 
 
 async def _run_scrape():
-    scraper = MacBidScraper()
-    items = await scraper.run()
+    scraper = MacBidApiScraper()
+    run_id = uuid.uuid4().hex
+
+    # Every chunk registers on a latch keyed by this run, and the last one to
+    # finish queues the opportunity refresh. The scrape holds the latch open
+    # itself until all chunks are queued, so early finishers can't fire it.
+    # Broker and Redis calls block, so they run off the event loop.
+    await asyncio.to_thread(latch_add, _latch_key(run_id))
+    total = chunks = 0
+    chunk: list[dict] = []
+    try:
+        # Full chunks go out while the remaining pages are still being fetched
+        async for item in scraper.iter_items():
+            total += 1
+            chunk.append(item)
+            if len(chunk) >= SCRAPE_CHUNK_SIZE:
+                await asyncio.to_thread(_queue_chunk, run_id, chunk)
+                chunks += 1
+                chunk = []
+        if chunk:
+            await asyncio.to_thread(_queue_chunk, run_id, chunk)
+            chunks += 1
+    finally:
+        await asyncio.to_thread(_finish_chunk, run_id)
 
-    Session = _get_async_session()
-    async with Session() as db:
-        new_listings = 0
-        updated_listings = 0
+    logger.info("Scraped %d listings, queued %d chunks for storage", total, chunks)
+
+
+def _latch_key(run_id: str) -> str:
+    return f"scrape:{run_id}"
+
+
+def _queue_chunk(run_id: str, items: list[dict]):
+    latch_add(_latch_key(run_id))
+    persist_scrape_chunk.delay(run_id, items)
 
-        for item in items:
-            listing_id = item["listing_id"]
 
-            # Check if listing already exists
+def _finish_chunk(run_id: str):
+    # Recompute opportunities once every chunk of the run has committed
+    if latch_done(_latch_key(run_id)):
+        refresh_opportunities.delay()
+
+
+async def _persist_items(items: list[dict]) -> list[dict]:
+    """Store one chunk of scraped items.
+
+    Returns the price lookups owed to the newly inserted listings, for the
+    caller to queue once this has committed.
+    """
+    Session = get_session_factory()
+    async with Session() as db:
+        rows: list[dict] = []
+        pending_lookups: list[tuple[str, dict]] = []
+
+        # Resolve existing listings and products up front rather than per item
+        listing_ids = [item["listing_id"] for item in items]
+        upcs = {item["upc"] for item in items if item.get("upc")}
+        existing_listings = {}
+        if listing_ids:
             result = await db.execute(
-                select(MacBidListing).where(MacBidListing.listing_id == listing_id)
+                select(MacBidListing.listing_id, MacBidListing.id, MacBidListing.product_id)
+                .where(MacBidListing.listing_id.in_(listing_ids))
             )
-            existing = result.scalar_one_or_none()
+            existing_listings = {row.listing_id: row for row in result}
+        product_ids: dict[str, uuid.UUID] = {}
+        if upcs:
+            result = await db.execute(
+                select(Product.upc, Product.id).where(Product.upc.in_(upcs))
+            )
+            product_ids = dict(result.tuples().all())
 
+        new_products: list[dict] = []
+        new_items: list[tuple[dict, uuid.UUID]] = []
+        for item in items:
+            existing = existing_listings.get(item["listing_id"])
             if existing:
-                # Update bid price
-                existing.current_bid = item["current_bid"]
-                if item.get("closes_at"):
-                    existing.closes_at = item["closes_at"]
-                updated_listings += 1
+                # Only the bid and closing time are updated on conflict
+                rows.append(_listing_row(item, existing.id, existing.product_id))
                 continue
 
-            # Find or create product
-            product = None
-            if item.get("upc"):
+            # Find or create product; ids are generated here so nothing
+            # has to be flushed to learn them
+            upc = item.get("upc")
+            product_id = product_ids.get(upc) if upc else None
+            if product_id is None:
+                product_id = uuid.uuid4()
+                new_products.append({
+                    "id": product_id,
+                    "upc": upc,
+                    "title": item["title"],
+                    "image_url": item.get("image_url"),
+                })
+                if upc:
+                    product_ids[upc] = product_id
+            new_items.append((item, product_id))
+
+        if new_products:
+            # Chunks are stored concurrently and may share UPCs; inserting in
+            # a fixed order keeps them from waiting on each other in a cycle
+            new_products.sort(key=lambda p: p["upc"] or "")
+            result = await db.execute(
+                pg_insert(Product)
+                .on_conflict_do_nothing(index_elements=["upc"])
+                .returning(Product.id),
+                new_products,
+            )
+            created = set(result.scalars())
+
+            # Another scrape may have created some of these UPCs since the
+            # lookup above; point our listings at its products instead
+            lost = [p["upc"] for p in new_products if p["id"] not in created]
+            if lost:
                 result = await db.execute(
-                    select(Product).where(Product.upc == item["upc"])
-                )
-                product = result.scalar_one_or_none()
-
-            if not product:
-                product = Product(
-                    id=uuid.uuid4(),
-                    upc=item.get("upc"),
-                    title=item["title"],
-                    image_url=item.get("image_url"),
+                    select(Product.upc, Product.id).where(Product.upc.in_(lost))
                 )
-                db.add(product)
-                await db.flush()
-
-            # Create listing
-            condition_str = item.get("condition", "unknown")
-            try:
-                condition = ItemCondition(condition_str)
-            except ValueError:
-                condition = ItemCondition.UNKNOWN
-
-            listing = MacBidListing(
-                id=uuid.uuid4(),
-                listing_id=listing_id,
-                product_id=product.id,
-                current_bid=item["current_bid"] or 0,
-                retail_price=item.get("retail_price"),
-                condition=condition,
-                warehouse_location=item.get("warehouse_location"),
-                closes_at=item.get("closes_at"),
-                status=AuctionStatus.ACTIVE,
-                url=item.get("url"),
-                extra_data=item.get("extra_data"),
+                remap = {product_ids[upc]: pid for upc, pid in result.tuples()}
+                new_items = [(item, remap.get(pid, pid)) for item, pid in new_items]
+
+        for item, product_id in new_items:
+            rows.append(_listing_row(item, uuid.uuid4(), product_id))
+            pending_lookups.append((item["listing_id"], {
+                "product_id": str(product_id),
+                "upc": item.get("upc"),
+                "title": item["title"],
+            }))
+
+        # One upsert for every listing in the chunk, new or existing
+        inserted = await bulk_upsert_listings(db, rows)
+        await db.commit()
+
+        logger.info("Stored scrape chunk: %d new, %d updated", len(inserted), len(rows) - len(inserted))
+        return [lookup for listing_id, lookup in pending_lookups if listing_id in inserted]
+
+
+def _queue_lookups(lookups: list[dict]):
+    """Publish ``lookup_prices`` jobs over one broker connection."""
+    with celery_app.producer_or_acquire() as producer:
+        for lookup in lookups:
+            lookup_prices.apply_async(
+                (lookup["product_id"], lookup["upc"], lookup["title"]),
+                producer=producer,
             )
-            db.add(listing)
-            new_listings += 1
 
-            # Trigger price lookups for new listings
-            from app.tasks.lookup import lookup_prices
-            lookup_prices.delay(str(product.id), item.get("upc"), item["title"])
 
-        await db.commit()
-        logger.info("Scrape complete: %d new, %d updated", new_listings, updated_listings)
+def _listing_row(item: dict, row_id: uuid.UUID, product_id: uuid.UUID) -> dict:
+    """MacBidListing column values for ``bulk_upsert_listings``."""
+    condition = _COND.get(item.get("condition"), ItemCondition.UNKNOWN)
+    return {
+        "id": row_id,
+        "listing_id": item["listing_id"],
+        "product_id": product_id,
+        "current_bid": item["current_bid"] or 0,
+        "retail_price": item.get("retail_price"),
+        "condition": condition.name,
+        "warehouse_location": item.get("warehouse_location"),
+        "closes_at": item.get("closes_at"),
+        "status": AuctionStatus.ACTIVE.name,
+        "url": item.get("url"),
+        "extra_data": item.get("extra_data"),
+    }
 
 
 @celery_app.task(name="app.tasks.scrape.scrape_macbid", bind=True, max_retries=3)
+@single_flight("scrape_macbid", ttl=30 * 60)
 def scrape_macbid(self):
-    """Scrape MacBid auctions and store new/updated listings."""
+    """Scrape MacBid auctions and fan the listings out for storage."""
     try:
-        asyncio.run(_run_scrape())
+        run(_run_scrape())
     except Exception as exc:
         logger.exception("MacBid scrape failed")
         self.retry(exc=exc, countdown=60)
+
+
+@celery_app.task(name="app.tasks.scrape.persist_scrape_chunk", bind=True, max_retries=3)
+def persist_scrape_chunk(
+    self, run_id: str, items: list[dict], lookups: list[dict] | None = None
+) -> int:
+    """Store one chunk of scraped listings and queue lookups for the new ones.
+
+    ``lookups`` is only set on a retry whose chunk already committed, which
+    then just publishes them: the listings are no longer new, so storing the
+    chunk again would not bring them back.
+    """
+    try:
+        if lookups is None:
+            lookups = run(_persist_items(items))
+        if lookups:
+            _queue_lookups(lookups)
+    except Exception as exc:
+        logger.exception("Storing %d scraped listings failed", len(items))
+        if self.request.retries < self.max_retries:
+            self.retry(kwargs={"lookups": lookups}, exc=exc, countdown=30)
+        # Given up on this chunk; don't hold the refresh back for it
+        _finish_chunk(run_id)
+        raise
+    _finish_chunk(run_id)
+    return len(lookups)